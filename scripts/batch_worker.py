@@ -0,0 +1,143 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Script to run many small per-window jobs in one python process, so that python is started and
+modules like pandas, Biopython and numpy are imported once per batch instead of once per window.
+Input is a manifest: a tab-separated text file with one job per line, the task name followed by its arguments.
+Modules are only imported for the tasks that appear in the manifest, the first time they are needed.
+Jobs are run in manifest order. A failing job is reported and the next jobs still run,
+the script exits with an error at the end if any job failed.
+
+Tasks and arguments:
+pairwise_pi     infile.fasta outfile.csv                  same as: python3 pairwise_pi.py infile.fasta > outfile.csv
+nj              infile.csv outfile.nwk [outgroup]         NJ tree of a pi matrix with fast_nj.py, "NaN" for matrices with missing values
+fasta2phylip    infile.fasta outfile.phy                  same as: python fasta2phylip.py --input infile.fasta --output outfile.phy
+ctl             infile.phy infile.nwk outfile.ctl         same as: python generate_ctlMCMC.py --phy infile.phy --nwk infile.nwk --ctl outfile.ctl
+het             infile.est.ml outfile.txt                 same as: python getHetvalues_folded.py infile.est.ml > outfile.txt
+
+With --timings, writes a tab-separated table with the run time of every job (task, first argument, seconds, status),
+with the import time of each task on a separate line (first argument "(import)").
+
+USAGE
+python3 batch_worker.py --manifest manifest.tsv [--timings timings.tsv]
+
+from batch_worker import run_task
+run_task("pairwise_pi", ["infile.fasta", "outfile.csv"])
+
+Created 18OCT26
+"""
+
+# Import modules
+import argparse
+import importlib
+import os
+import sys
+import time
+import traceback
+
+# Define functions
+def pairwise_pi_task(infile, outfile):
+    from pairwise_pi import pairwise_pi_fasta
+    with open(outfile, "w") as out:
+        out.write(pairwise_pi_fasta(infile).to_csv() + "\n")
+
+def nj_task(infile, outfile, outgroup = None):
+    import numpy as np
+    from pairwise_pi_sum import read_pi_csv
+    from fast_nj import nj_newick
+    infile, ids, matrix, error = read_pi_csv(infile)
+    if error:
+        raise Exception("Could not read {}: {}".format(infile, error))
+    with open(outfile, "w") as nwk:
+        nwk.write("NaN" if np.isnan(matrix).any() else nj_newick(matrix, ids, outgroup))
+
+def fasta2phylip_task(infile, outfile):
+    from fasta2phylip import fasta2phylip_file
+    fasta2phylip_file(infile, outfile)
+
+def ctl_task(phy, nwk, ctl):
+    from generate_ctlMCMC import write_ctl
+    write_ctl(phy, nwk, ctl)
+
+def het_task(infile, outfile):
+    from getHetvalues_folded import het_values
+    with open(outfile, "w") as out:
+        for line in het_values(infile):
+            out.write(line + "\n")
+
+# Task name: (function, modules imported by the task)
+TASKS = {
+    "pairwise_pi": (pairwise_pi_task, ["pairwise_pi"]),
+    "nj": (nj_task, ["numpy", "pairwise_pi_sum", "fast_nj"]),
+    "fasta2phylip": (fasta2phylip_task, ["fasta2phylip"]),
+    "ctl": (ctl_task, ["generate_ctlMCMC"]),
+    "het": (het_task, ["getHetvalues_folded"])
+}
+
+def load_task(task):
+    # Imports the modules of a task and returns the time it took in seconds
+    assert task in TASKS, "Unknown task {}, choose from {}".format(task, ", ".join(sorted(TASKS)))
+    start = time.perf_counter()
+    for module in TASKS[task][1]:
+        importlib.import_module(module)
+    return time.perf_counter() - start
+
+def run_task(task, arguments):
+    # Runs one job and returns the time it took in seconds
+    start = time.perf_counter()
+    TASKS[task][0](*arguments)
+    return time.perf_counter() - start
+
+def read_manifest(infile):
+    # Returns the jobs of a manifest as a list of (task, arguments). Empty lines and lines starting with # are skipped.
+    jobs = []
+    with open(infile) as manifest:
+        for line in manifest:
+            fields = line.rstrip("\n").split("\t")
+            if not fields[0] or fields[0].startswith("#"):
+                continue
+            assert fields[0] in TASKS, "Unknown task {} in {}".format(fields[0], infile)
+            jobs.append((fields[0], fields[1:]))
+    return jobs
+
+if __name__ == "__main__":
+    # Initialize parser
+    parser = argparse.ArgumentParser(description = "Run a manifest of per-window jobs in one process. Tasks: " + ", ".join(sorted(TASKS)))
+    parser.add_argument("-m", "--manifest", required = True, metavar = "manifest.tsv", help = "Tab-separated file with one job per line: task name and arguments")
+    parser.add_argument("-t", "--timings", metavar = "timings.tsv", help = "Output file with the run time of every job")
+    args = parser.parse_args()
+
+    # Scripts imported by the tasks are next to this one
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    jobs = read_manifest(args.manifest)
+
+    timings = open(args.timings, "w") if args.timings else None
+    if timings:
+        timings.write("task\tinput\tseconds\tstatus\n")
+    loaded = set()
+    failed = 0
+    start = time.perf_counter()
+    for task, arguments in jobs:
+        if task not in loaded:
+            seconds = load_task(task)
+            loaded.add(task)
+            if timings:
+                timings.write("{}\t(import)\t{:.4f}\tok\n".format(task, seconds))
+        job_start = time.perf_counter()
+        try:
+            run_task(task, arguments)
+            status = "ok"
+        except Exception:
+            failed += 1
+            status = "failed"
+            print("Job failed: " + "\t".join([task] + arguments), file = sys.stderr)
+            traceback.print_exc()
+        if timings:
+            timings.write("{}\t{}\t{:.4f}\t{}\n".format(task, arguments[0] if arguments else "", time.perf_counter() - job_start, status))
+    if timings:
+        timings.close()
+
+    print("Ran {} jobs in {:.1f} s, {} failed".format(len(jobs), time.perf_counter() - start, failed), file = sys.stderr)
+    if failed:
+        sys.exit(1)
@@ -20,35 +20,25 @@ e.g. python check_Ncontent.py /home/jlescroa/eclipse-workspace/PUCRS/windows 70
 Directory is the folder containing the fastas and must be specified.
 Newly created directory will be at the height of /home/jlescroa/eclipse-workspace/PUCRS/ (in this example).
 Cut-off value is given in as percentage from 0 to 100 and is optional, default is 50.
+Optional: --processes N to check windows in parallel, --copy to copy informative windows instead of hardlinking them.
 
 Author: Jonas Lescroart
 
 UPDATES
 11JAN21: included IUPAC ambiguity codes in assertion of function 'informative'.
 03MAR21: additional output: list with filenames of informative windows, for input in RAxML
+18OCT26: symbols are counted per sequence with numpy (bincount over bytes) instead of per character,
+windows are checked in a process pool, and informative windows are hardlinked (or copied) instead of rewritten line by line.
+Lowercase (soft-masked) symbols are counted as their uppercase symbols: acgt as bases, n as missing data.
 """
 
 #import modules
 import sys
 import os
-
-#assertions about directory
-assert len(sys.argv) > 1, "Please provide a full directory as first argument."
-assert os.path.isdir(sys.argv[1]), "Please make sure the first argument is a full directory."
-os.chdir(sys.argv[1])
-print("Folder is: " + sys.argv[1])
-
-#assertions about cut-off
-if len(sys.argv) == 3:
-    assert float(sys.argv[2])
-    assert int(sys.argv[2]) <= 100 and int(sys.argv[2]) >= 0, "Cut-off value must be an int between 0 and 100"
-    temp_cutoff = int(sys.argv[2])
-    print("Cut-off is set to " + str(temp_cutoff) + " percent")
-else:
-    temp_cutoff = 50
-    print("Cut-off is " + str(temp_cutoff) + " percent by default.")
-
-cutoff_str = str(int(temp_cutoff))
+import shutil
+import argparse
+import numpy as np
+from multiprocessing import Pool
 
 #load functions    
 def informative(sequence, cutoff = 50):
@@ -69,76 +59,128 @@ def Nserter(sequence):
     new_sequence = "N" * length
     return new_sequence
 
-#create new directory
-new_dir = os.getcwd().split("/")
-new_dir[-2] = new_dir[-2] + cutoff_str
-new_dir = ("/").join(new_dir)
-
-if not os.path.exists(new_dir):
-    os.makedirs(new_dir)
-
-#set initial values
-total_fastas = 0
-uninformative_fastas = 0
-informative_filenames = []
-
-#iterate through .fasta and .fa files
-for filename in os.listdir(str(sys.argv[1])):
-    if filename.endswith(".fa") or filename.endswith(".fasta"): 
-        
-        #determine whether window is informative
-        total_fastas += 1
-        window = open(filename, "r")
-        window_content = window.readlines()
-        good_window = True
-
-        for line in window_content:
-            if line[0] != ">" and line[0] in "ACGTN" and good_window == True:
-                good_window = informative(line.rstrip(), temp_cutoff)
-            else:
-                pass
-        window.close()
-
-        #creat new file
-        window = open(new_dir +"/" + filename, "w")
-        
-        #if not informative, transform in N's
-        if not good_window:
-            uninformative_fastas += 1
-            count = 0
+# Symbols in both cases, lowercase (soft-masked) bases count as bases
+VALID_SYMBOLS = np.frombuffer(b"ACGTMRWSYKVHDBN-acgtmrwsykvhdbn", dtype = np.uint8)
+MISSING_SYMBOLS = np.frombuffer(b"N-n", dtype = np.uint8)
+
+def symbol_counts(sequence):
+    # Returns a 256-bin histogram of the bytes in a sequence.
+    return np.bincount(np.frombuffer(sequence, dtype = np.uint8), minlength = 256)
+
+def window_counts(filename):
+    # Returns a list with (length, N/gap count, invalid symbol count) for each sequence in a window fasta file.
+    # The file is read as bytes and each sequence is counted at once, newlines excluded.
+    with open(filename, "rb") as window:
+        content = window.read()
+    counts = []
+    for record in content.split(b">")[1:]:
+        sequence = record[record.find(b"\n") + 1:].translate(None, b"\r\n")
+        histogram = symbol_counts(sequence)
+        counts.append((len(sequence), int(histogram[MISSING_SYMBOLS].sum()), len(sequence) - int(histogram[VALID_SYMBOLS].sum())))
+    return counts
+
+def informative_counts(length, missing, cutoff = 50):
+    # Same criterion as informative, from counts (numbers or numpy arrays, also used by window_index.py).
+    return missing - 0.00000000001 < ((1 - (float(cutoff) / float(100))) * length)
+
+def check_window(args):
+    # Checks one window file and writes it to the new directory: hardlinked or copied if informative, as N-strings if not.
+    # Returns the filename and whether the window is informative.
+    filename, new_dir, cutoff, copy = args
+    counts = window_counts(filename)
+    for length, missing, invalid in counts:
+        assert invalid == 0, "Sequence contains symbols other than A,T,C,G, IUPAC ambiguity codes or N, - in " + filename
+    good_window = all(informative_counts(length, missing, cutoff) for length, missing, invalid in counts)
+    write_checked_window(filename, new_dir + "/" + filename, good_window, copy)
+    return filename, good_window
+
+def write_checked_window(filename, new_file, good_window, copy = False):
+    # Writes a checked window to new_file: hardlinked (or copied) if informative, as N-strings if not.
+    if os.path.lexists(new_file):
+        os.remove(new_file)
+    if good_window:
+        try:
+            if copy:
+                raise OSError
+            os.link(filename, new_file)
+        except OSError:
+            shutil.copyfile(filename, new_file)
+    else:
+        with open(filename, "r") as window:
+            window_content = window.readlines()
+        with open(new_file, "w") as window:
             for line in window_content:
-                if line[0] != ">" and line[0] in "ACGTN":
-                    window_content[count] = (Nserter(line.rstrip()) + "\n")
-                else:
-                    pass
-                count +=1 
-
-        elif good_window:
-            informative_filenames.append(filename)
-        
-        for line in window_content:
-            window.write(line)
-        window.close()
-        
+                if line[0] != ">":
+                    line = Nserter(line.rstrip()) + "\n"
+                window.write(line)
+
+def summary_text(directory, cutoff, total_fastas, uninformative_fastas):
+    # Returns the text of the summary file.
+    return ("Start folder is: " + directory + "\n" +
+            "Cut-off: " + str(cutoff) + "\n" +
+            "Total number of files processed: " + str(total_fastas) + "\n" +
+            "Folder contained " + str((float(uninformative_fastas) / float(total_fastas)) * 100) + "% uninformative files." + "\n" +
+            "Number of files converted to N-strings: " + str(uninformative_fastas)
+            )
+
+if __name__ == "__main__":
+    #take command line arguments, positional as before
+    parser = argparse.ArgumentParser()
+    parser.add_argument("directory", help = "Full directory with the window fastas")
+    parser.add_argument("cutoff", nargs = "?", help = "Cut-off value as percentage from 0 to 100, default 50")
+    parser.add_argument("-p", "--processes", type = int, default = 1, help = "Number of processes, default 1")
+    parser.add_argument("--copy", action = "store_true", help = "Copy informative windows instead of hardlinking them")
+    args = parser.parse_args()
+
+    #assertions about directory
+    assert os.path.isdir(args.directory), "Please make sure the first argument is a full directory."
+    os.chdir(args.directory)
+    print("Folder is: " + args.directory)
+
+    #assertions about cut-off
+    if args.cutoff is not None:
+        assert float(args.cutoff)
+        assert int(args.cutoff) <= 100 and int(args.cutoff) >= 0, "Cut-off value must be an int between 0 and 100"
+        temp_cutoff = int(args.cutoff)
+        print("Cut-off is set to " + str(temp_cutoff) + " percent")
+    else:
+        temp_cutoff = 50
+        print("Cut-off is " + str(temp_cutoff) + " percent by default.")
+
+    cutoff_str = str(int(temp_cutoff))
+
+    #create new directory
+    new_dir = os.getcwd().split("/")
+    new_dir[-2] = new_dir[-2] + cutoff_str
+    new_dir = ("/").join(new_dir)
+
+    if not os.path.exists(new_dir):
+        os.makedirs(new_dir)
+
+    #iterate through .fasta and .fa files
+    filenames = [filename for filename in os.listdir(args.directory) if filename.endswith(".fa") or filename.endswith(".fasta")]
+    tasks = ((filename, new_dir, temp_cutoff, args.copy) for filename in filenames)
+    if args.processes > 1:
+        with Pool(args.processes) as pool:
+            results = list(pool.imap(check_window, tasks, chunksize = 64))
     else:
-        None    
-
-#output summary statements
-sum_dir = new_dir.split("/")
-del sum_dir[-1]
-sum_dir = ("/").join(sum_dir)
-
-summary = open(sum_dir + "/summary_" + cutoff_str + ".txt", "w")
-summary.write("Start folder is: " + sys.argv[1] + "\n" + 
-              "Cut-off: " + str(temp_cutoff) + "\n" +
-              "Total number of files processed: " + str(total_fastas) + "\n" + 
-              "Folder contained " + str((float(uninformative_fastas) / float(total_fastas)) * 100) + "% uninformative files." + "\n" + 
-              "Number of files converted to N-strings: " + str(uninformative_fastas)
-              )
-summary.close()
-
-#output list with filenames of informative windows
-filenames = open(sum_dir + "/filenames_informative.txt", "w")
-informative_filenames = map(lambda x:x + '\n', informative_filenames)
-filenames.writelines(informative_filenames)
-filenames.close()
+        results = [check_window(task) for task in tasks]
+
+    total_fastas = len(results)
+    informative_filenames = [filename for filename, good_window in results if good_window]
+    uninformative_fastas = total_fastas - len(informative_filenames)
+
+    #output summary statements
+    sum_dir = new_dir.split("/")
+    del sum_dir[-1]
+    sum_dir = ("/").join(sum_dir)
+
+    summary = open(sum_dir + "/summary_" + cutoff_str + ".txt", "w")
+    summary.write(summary_text(args.directory, temp_cutoff, total_fastas, uninformative_fastas))
+    summary.close()
+
+    #output list with filenames of informative windows
+    filenames = open(sum_dir + "/filenames_informative.txt", "w")
+    informative_filenames = map(lambda x:x + '\n', informative_filenames)
+    filenames.writelines(informative_filenames)
+    filenames.close()
@@ -8,6 +8,12 @@ List file or list of arguments: The absolute path for the genomes in order, one
 USAGE
 createWindow_aln_JL.py DATASETXXX.list
 Or: createWindow_aln_JL.py genome1.fasta genome2.fasta ...
+Optional: --unordered [--max-open N] if the genomes don't list the windows in the same order
+Optional: --container PREFIX to write one indexed container file (see window_container.py) instead of the windows folder
+Optional: --fai-windows SIZE [--processes N] to cut windows of SIZE bp straight from whole genomes (*.fa with samtools faidx
+    *.fa.fai index), instead of from the bedtools makewindows + getfasta output (*.fas) of every genome
+    With --mask BED --masked DIR, the same windows are also written hard-masked (like bedtools maskfasta) to DIR/windows/,
+    with DIR/filenames.txt, so unmasked and masked windows come from one read of every genome
 
 AUTHOR AND CHANGE LOG
 Written by: Henrique V Figueiro - henriquevf@gmail.com
@@ -17,50 +23,222 @@ Following changes were made:
 2/ input genomes can be given from command line as alternative to list file;
 3/ output txt file is produced listing all the names of output alignment files;
 4/ bunch of smaller changes
+Changes on 18 October 2026:
+5/ genomes are read in lockstep and each window file is written once, in full (was: opened, appended and closed
+once per genome per window); filenames.txt is opened once;
+6/ re-running no longer appends duplicate records to existing window files;
+7/ --unordered: for genomes with windows in different order, appends through a bounded cache of open files;
+8/ --container: all windows in a single indexed file.
+9/ --fai-windows: windows read from the genomes through their .fai index and a memory map (see fasta_windows.py),
+no bedtools getfasta copy of every genome needed; optionally in parallel with --processes.
+10/ --mask and --masked: repeatmasked windows written in the same pass, no bedtools maskfasta copy of every genome needed.
 """
 
-from Bio import SeqIO
+from Bio.SeqIO.FastaIO import SimpleFastaParser
+from collections import OrderedDict
+import argparse
 import sys
 import os
 
-#Take arguments, either list file with genomes or genomes directly
+#Define functions
 
-if sys.argv[1].endswith(tuple([".txt", ".list"])):
-    dataset = open(sys.argv[1], 'r')
-    lines = dataset.read().splitlines()
-elif sys.argv[1].endswith(tuple([".fasta", "fa", "fas", "fna"])):
-    lines = sys.argv[1:]
-else:
-    raise Exception("Invalid input arguments")
+class HandleCache(object):
+    # Keeps at most max_open window files open for appending, closing the least recently used one when needed.
+    # A file is truncated the first time it is opened in a run, so running the script again doesn't duplicate records.
+    def __init__(self, max_open = 512):
+        self.max_open = max_open
+        self.handles = OrderedDict()
+        self.seen = set()
 
-#Create windows folder
+    def write(self, path, text):
+        handle = self.handles.pop(path, None)
+        if handle is None:
+            if len(self.handles) >= self.max_open:
+                self.handles.popitem(last = False)[1].close()
+            handle = open(path, 'a' if path in self.seen else 'w')
+            self.seen.add(path)
+        self.handles[path] = handle
+        handle.write(text)
 
-if not os.path.exists(os.getcwd() + '/windows/'):
-    os.makedirs(os.getcwd() + '/windows/')
+    def close(self):
+        for handle in self.handles.values():
+            handle.close()
+        self.handles.clear()
 
-chr_dir = os.getcwd() + '/windows/'
+def read_genome(filename):
+    # Yields (record id, sequence) for each record of a genome, record id as in SeqIO (first word of the header)
+    with open(filename, 'r') as handle:
+        for title, seq in SimpleFastaParser(handle):
+            yield title.split(None, 1)[0], seq
 
-#Read genome filenames and get spp names
+def write_windows_lockstep(genomes, names, chr_dir, filenames_txt, container = None):
+    # Reads all genomes record by record in parallel and writes every window file once, with all genomes.
+    # Files are written under a temporary name first, so an interrupted run never leaves a partial window behind.
+    # With container (a WindowContainerWriter), windows are added to the container instead of written as files.
+    readers = [read_genome(genome) for genome in genomes]
+    with open(filenames_txt, 'w') as filenames:
+        for records in zip(*readers):
+            record_ids = set(record_id for record_id, seq in records)
+            if len(record_ids) > 1:
+                raise Exception("Genomes list different windows at the same position (" + ", ".join(sorted(record_ids)) + "), use --unordered")
+            record_id = records[0][0]
+            if container is not None:
+                container.add(record_id, [seq for record_id, seq in records])
+            else:
+                out_path = chr_dir + record_id + ".fasta"
+                with open(out_path + ".tmp", 'w') as out_file:
+                    for name, (record_id, seq) in zip(names, records):
+                        out_file.write('>' + name + '\n' + seq + '\n')
+                os.replace(out_path + ".tmp", out_path)
+            filenames.write(record_id + ".fasta" + '\n')
+    for genome, reader in zip(genomes, readers):
+        if next(reader, None) is not None:
+            raise Exception("Genome " + genome + " has more windows than the other genomes, use --unordered")
 
-names = list()
+_genomes = None # FaiFasta objects of a worker process
+_mask = None # repeat intervals per chromosome of a worker process
 
-for i in range(len(lines)):
-    line = lines[i]
-    name = str(('.').join(line.split('/')[-1].split('.')[:-1]))
-    names.append(name)
-    print(names[i])
+def _open_genomes(genomes, mask = None):
+    # Pool initializer
+    global _genomes, _mask
+    from fasta_windows import open_fai_genomes, read_mask_bed
+    _genomes = open_fai_genomes(genomes)
+    _mask = read_mask_bed(mask) if mask else None
 
-#Create each window fasta file and append the subsequent genomes
+def write_window(out_path, names, seqs):
+    # Writes one window file with all genomes, under a temporary name first
+    with open(out_path + ".tmp", 'wb') as out_file:
+        for name, seq in zip(names, seqs):
+            out_file.write(b'>' + name.encode() + b'\n' + seq + b'\n')
+    os.replace(out_path + ".tmp", out_path)
 
-for i in range(len(lines)):
-    with open(str(lines[i].rstrip()), 'r') as handle:
-        for record in SeqIO.parse(handle, 'fasta'):
-            with open(chr_dir + record.id + ".fasta", 'a') as out_file:
-                seq_name = str('>' + names[i])
-                seq =  str(record.seq)
-                out_file.write(seq_name + '\n' + seq + '\n')
-            out_file.close()
-            if i == 0: # produce txt file with names of output files for downstream processing
-                with open("filenames.txt", 'a') as out_file:
-                    out_file.write(record.id + ".fasta" + '\n')
-                out_file.close()
+def _write_fai_windows(args):
+    # Pool worker: writes a chunk of windows (and their masked version to masked_dir), returns their file names
+    names, chr_dir, masked_dir, windows = args
+    from fasta_windows import window_name, mask_sequence
+    filenames = []
+    for record_id, start, end in windows:
+        window = window_name(record_id, start, end)
+        seqs = [genome.fetch(record_id, start, end) for genome in _genomes]
+        write_window(chr_dir + window + ".fasta", names, seqs)
+        if masked_dir is not None:
+            intervals = _mask.get(record_id)
+            write_window(masked_dir + window + ".fasta", names, [mask_sequence(seq, intervals, start) for seq in seqs])
+        filenames.append(window + ".fasta")
+    return filenames
+
+def write_windows_fai(genomes, names, chr_dir, filenames_txt, size, container = None, processes = 1, mask = None, masked_dir = None, masked_filenames_txt = None):
+    # Cuts windows of size bp (like bedtools makewindows + getfasta) from genomes with a .fai index, and writes every
+    # window file once, with all genomes. Windows are read through memory maps, in chunks over processes if processes > 1.
+    # With mask (bed file) and masked_dir, every window is also written hard-masked to masked_dir, from the same read.
+    from fasta_windows import make_windows, read_fai, iter_fai_windows
+    if container is not None:
+        with open(filenames_txt, 'w') as filenames:
+            for window, seqs in iter_fai_windows(genomes, size):
+                container.add(window, seqs)
+                filenames.write(window + ".fasta" + '\n')
+        return
+    windows = make_windows(read_fai(genomes[0] + ".fai"), size)
+    chunks = [(names, chr_dir, masked_dir, windows[i:i + 256]) for i in range(0, len(windows), 256)]
+    if processes > 1:
+        from multiprocessing import Pool
+        pool = Pool(processes, initializer = _open_genomes, initargs = (genomes, mask))
+        results = pool.imap(_write_fai_windows, chunks)
+    else:
+        pool = None
+        _open_genomes(genomes, mask)
+        results = map(_write_fai_windows, chunks)
+    outputs = [filenames_txt] + ([masked_filenames_txt] if masked_dir is not None else [])
+    filenames = [open(output, 'w') for output in outputs]
+    try:
+        for chunk in results:
+            for handle in filenames:
+                handle.writelines(filename + '\n' for filename in chunk)
+    finally:
+        for handle in filenames:
+            handle.close()
+        if pool:
+            pool.close()
+            pool.join()
+
+def write_windows_unordered(genomes, names, chr_dir, filenames_txt, max_open = 512):
+    # Appends each genome to the window files like the original script, but through a bounded cache of open files.
+    cache = HandleCache(max_open)
+    try:
+        with open(filenames_txt, 'w') as filenames:
+            for i in range(len(genomes)):
+                for record_id, seq in read_genome(genomes[i]):
+                    cache.write(chr_dir + record_id + ".fasta", '>' + names[i] + '\n' + seq + '\n')
+                    if i == 0: # produce txt file with names of output files for downstream processing
+                        filenames.write(record_id + ".fasta" + '\n')
+    finally:
+        cache.close()
+
+if __name__ == "__main__":
+
+    #Take arguments, either list file with genomes or genomes directly
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('genomes', nargs = '+', help = "List file with genomes (.txt or .list) or the genomes themselves")
+    parser.add_argument('--unordered', action = 'store_true', help = "Genomes don't list the windows in the same order")
+    parser.add_argument('--max-open', type = int, default = 512, help = "Maximum number of open window files with --unordered, default 512")
+    parser.add_argument('--container', help = "Write all windows to a single container PREFIX.aln (+ PREFIX.aln.idx) instead of the windows folder")
+    parser.add_argument('--compress', action = 'store_true', help = "Compress the windows in the container")
+    parser.add_argument('--fai-windows', type = int, metavar = 'SIZE', help = "Cut windows of SIZE bp from whole genomes with a .fai index (samtools faidx)")
+    parser.add_argument('--processes', type = int, default = 1, help = "Number of processes writing windows with --fai-windows, default 1")
+    parser.add_argument('--mask', metavar = 'BED', help = "With --fai-windows and --masked: bed file with the intervals to hard-mask (e.g. rmsk2bed output)")
+    parser.add_argument('--masked', metavar = 'DIR', help = "With --fai-windows and --mask: also write the masked windows to DIR/windows/ and DIR/filenames.txt")
+    args = parser.parse_args()
+
+    if args.genomes[0].endswith(tuple([".txt", ".list"])):
+        dataset = open(args.genomes[0], 'r')
+        lines = dataset.read().splitlines()
+    elif args.genomes[0].endswith(tuple([".fasta", "fa", "fas", "fna"])):
+        lines = args.genomes
+    else:
+        raise Exception("Invalid input arguments")
+    lines = [line.rstrip() for line in lines if line.strip()]
+
+    assert not (args.container and args.unordered), "--container can't be used with --unordered"
+    assert not (args.fai_windows and args.unordered), "--fai-windows can't be used with --unordered"
+    assert bool(args.mask) == bool(args.masked), "--mask and --masked go together"
+    assert not args.mask or (args.fai_windows and not args.container), "--mask needs --fai-windows, and can't be used with --container"
+
+    #Create windows folder
+
+    if not args.container and not os.path.exists(os.getcwd() + '/windows/'):
+        os.makedirs(os.getcwd() + '/windows/')
+
+    chr_dir = os.getcwd() + '/windows/'
+
+    #Read genome filenames and get spp names
+
+    names = list()
+
+    for i in range(len(lines)):
+        line = lines[i]
+        name = str(('.').join(line.split('/')[-1].split('.')[:-1]))
+        names.append(name)
+        print(names[i])
+
+    #Create each window fasta file with all genomes
+
+    if args.unordered:
+        write_windows_unordered(lines, names, chr_dir, "filenames.txt", args.max_open)
+    elif args.container:
+        from window_container import WindowContainerWriter
+        with WindowContainerWriter(args.container, names, args.compress) as container:
+            if args.fai_windows:
+                write_windows_fai(lines, names, chr_dir, "filenames.txt", args.fai_windows, container)
+            else:
+                write_windows_lockstep(lines, names, chr_dir, "filenames.txt", container)
+    elif args.fai_windows:
+        masked_dir = None
+        if args.masked:
+            masked_dir = os.path.join(os.path.abspath(args.masked), 'windows', '')
+            if not os.path.exists(masked_dir):
+                os.makedirs(masked_dir)
+        write_windows_fai(lines, names, chr_dir, "filenames.txt", args.fai_windows, processes = args.processes,
+            mask = args.mask, masked_dir = masked_dir, masked_filenames_txt = os.path.join(args.masked, "filenames.txt") if args.masked else None)
+    else:
+        write_windows_lockstep(lines, names, chr_dir, "filenames.txt")
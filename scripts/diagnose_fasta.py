@@ -7,96 +7,124 @@ Maybe I'll add graphs and other parameters later.
 
 USAGE
 python diagnose_fasta.py FILENAME1.fasta FILENAME2.fasta ...
+python diagnose_fasta.py --processes 4 FILENAME1.fasta FILENAME2.fasta ...
+python diagnose_fasta.py --mask repeats.bed --output FILENAME_masked.info FILENAME.fasta
+    diagnoses the fasta as if hard-masked with the intervals in the bed file (like bedtools maskfasta), without writing it
 
 Version: 06 November 2020
+Update 18OCT26: files are read in chunks and all symbols are counted at once with a byte histogram
+(was: ten .count() scans per record), per-record stats are written as they come, files are processed
+in parallel with --processes; added counts of IUPAC ambiguity codes and other characters (e.g. gaps).
+Update 18OCT26: --mask to diagnose the hard-masked genome on the fly, --output for the name of the .info file.
 Author: Jonas Lescroart
 """
 
 #import modules
-from Bio import SeqIO
-import sys
+from fasta_windows import iter_fasta_blocks, read_mask_bed, mask_sequence
+from multiprocessing import Pool
+import numpy as np
+import argparse
+import datetime
 import os
 import re
-import datetime
-
-if sys.argv[1].endswith(tuple([".fasta", "fa", "fas", "fna"])):
-    infiles = sys.argv[1:]
-else:
-    raise Exception("Invalid input arguments")
-
-outfiles = list()
-date = datetime.datetime.now()
-
-for i in range(len(infiles)):
-    outfile = infiles[i].split(".")
+import shutil
+
+#define functions
+BASES = ["A", "T", "C", "G", "N"]
+IUPAC = "RYSWKMBDHV"
+WHITESPACE = b" \t"
+
+def symbol_counts(histogram):
+    # Returns length and counts of A, T, C, G, N, IUPAC ambiguity codes and other characters (both cases) from a 256-bin byte histogram
+    length = int(histogram.sum() - sum(histogram[byte] for byte in WHITESPACE))
+    counts = [int(histogram[ord(base)] + histogram[ord(base.lower())]) for base in BASES]
+    counts.append(int(sum(histogram[ord(code)] + histogram[ord(code.lower())] for code in IUPAC)))
+    counts.append(length - sum(counts))
+    return length, counts
+
+def format_counts(length, counts):
+    # Returns the ATCG-count lines of a record or a file
+    labels = BASES + ["IUPAC", "Other"]
+    return "".join("\n" + label + " " + '{:,}'.format(count) + ' {:.0%}'.format(count/length if length else 0) for label, count in zip(labels, counts))
+
+def info_filename(infile):
+    # Returns the name of the .info file for a fasta file
+    outfile = infile.split(".")
     if re.match("fasta|fa|fas|fna", outfile[-1]):
         outfile = outfile[:-1]
-    outfile = ".".join(outfile) + ".info"
-    outfiles.append(outfile)
-
-for i in range(len(infiles)):
-
-    with open(infiles[i], 'r') as handle:
-        length_total, a_total, t_total, c_total, g_total, n_total = [0]*6
-
-        with open(outfiles[i], 'w') as output:
-            sequencelvl_info = ""
-            sequence_ids = []
-            for record in SeqIO.parse(handle, 'fasta'):
-                sequence_ids.append(record.id)
-
-                length_seq = len(record.seq)
-                a_seq = str(record.seq).count("A") + str(record.seq).count("a")
-                t_seq = str(record.seq).count("T") + str(record.seq).count("t")
-                c_seq = str(record.seq).count("C") + str(record.seq).count("c")
-                g_seq = str(record.seq).count("G") + str(record.seq).count("g")
-                n_seq = str(record.seq).count("N") + str(record.seq).count("n")
-                #reverse search for other characters? like - or x
-                #also needs a count for iupac characters like Y, R, ...
-
-                length_total += length_seq
-                a_total += a_seq
-                t_total += t_seq
-                c_total += c_seq
-                g_total += g_seq
-                n_total += n_seq
-
-                sequencelvl_info = (
-                sequencelvl_info +
-                ">" + record.id + "\nseq length: " + '{:,}'.format(length_seq) +
-                "\nATCG-count: " +
-                "\nA " + '{:,}'.format(a_seq) + ' {:.0%}'.format(a_seq/length_seq) +
-                "\nT " + '{:,}'.format(t_seq) + ' {:.0%}'.format(t_seq/length_seq) +
-                "\nC " + '{:,}'.format(c_seq) + ' {:.0%}'.format(c_seq/length_seq) +
-                "\nG " + '{:,}'.format(g_seq) + ' {:.0%}'.format(g_seq/length_seq) +
-                "\nN " + '{:,}'.format(n_seq) + ' {:.0%}'.format(n_seq/length_seq) + "\n\n"
-                )
-
-            output.write(
-            "Diagnostics file for " + infiles[i] + " generated on " +
-            date.strftime("%d %B %Y.") + "\n\n" +
-            "Total length: " + '{:,}'.format(length_total) +
-            "\nOverall ATCG-count: " +
-            "\nA " + '{:,}'.format(a_total) + ' {:.0%}'.format(a_total/length_total) +
-            "\nT " + '{:,}'.format(t_total) + ' {:.0%}'.format(t_total/length_total) +
-            "\nC " + '{:,}'.format(c_total) + ' {:.0%}'.format(c_total/length_total) +
-            "\nG " + '{:,}'.format(g_total) + ' {:.0%}'.format(g_total/length_total) +
-            "\nN " + '{:,}'.format(n_total) + ' {:.0%}'.format(n_total/length_total) + "\n\n"
-            + "Number of sequences: " + str(len(sequence_ids)) + "\n"
-            + str(sequence_ids) + "\n\n"
-            + sequencelvl_info
-            )
-
-        output.close()
-
-        print(
-        infiles[i] +
-        "\nTotal length: " + '{:,}'.format(length_total) +
-        "\nOverall ATCG-count: " +
-        "\nA " + '{:,}'.format(a_total) + ' {:.0%}'.format(a_total/length_total) +
-        "\nT " + '{:,}'.format(t_total) + ' {:.0%}'.format(t_total/length_total) +
-        "\nC " + '{:,}'.format(c_total) + ' {:.0%}'.format(c_total/length_total) +
-        "\nG " + '{:,}'.format(g_total) + ' {:.0%}'.format(g_total/length_total) +
-        "\nN " + '{:,}'.format(n_total) + ' {:.0%}'.format(n_total/length_total) + "\n"
+    return ".".join(outfile) + ".info"
+
+def diagnose(infile, outfile, date, chunk_size = 1 << 23, mask = None):
+    # Writes the diagnostics file of one fasta file and returns the summary that is printed to screen.
+    # Per-record stats go to a temporary file while reading, the totals are written in front of them at the end.
+    # With mask (bed file), the sequences are hard-masked with its intervals while they are read.
+    intervals = read_mask_bed(mask) if mask else {}
+    total = np.zeros(256, dtype = np.int64)
+    histogram = np.zeros(256, dtype = np.int64)
+    sequence_ids = []
+    with open(outfile + ".records.tmp", 'w') as records:
+        def write_record(record_id, histogram):
+            length_seq, counts = symbol_counts(histogram)
+            records.write(">" + record_id + "\nseq length: " + '{:,}'.format(length_seq) + "\nATCG-count: " + format_counts(length_seq, counts) + "\n\n")
+
+        for record_id, block in iter_fasta_blocks(infile, chunk_size):
+            if not block: # start of a record
+                if sequence_ids:
+                    write_record(sequence_ids[-1], histogram)
+                    total += histogram
+                sequence_ids.append(record_id)
+                histogram[:] = 0
+                position = 0
+            if intervals:
+                length = len(block)
+                block = mask_sequence(block, intervals.get(record_id), position)
+                position += length
+            histogram += np.bincount(np.frombuffer(block, dtype = np.uint8), minlength = 256)
+        if sequence_ids:
+            write_record(sequence_ids[-1], histogram)
+            total += histogram
+
+    length_total, counts_total = symbol_counts(total)
+    summary = "Total length: " + '{:,}'.format(length_total) + "\nOverall ATCG-count: " + format_counts(length_total, counts_total) + "\n"
+    with open(outfile + ".tmp", 'w') as output:
+        output.write(
+        "Diagnostics file for " + infile + (" masked with " + mask if mask else "") + " generated on " +
+        date.strftime("%d %B %Y.") + "\n\n" + summary + "\n"
         + "Number of sequences: " + str(len(sequence_ids)) + "\n"
+        + str(sequence_ids) + "\n\n"
         )
+        with open(outfile + ".records.tmp", 'r') as records:
+            shutil.copyfileobj(records, output)
+    os.remove(outfile + ".records.tmp")
+    os.replace(outfile + ".tmp", outfile)
+    return infile + "\n" + summary + "Number of sequences: " + str(len(sequence_ids)) + "\n"
+
+def _diagnose(args):
+    # Pool worker
+    return diagnose(*args)
+
+if __name__ == "__main__":
+    #take command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("infiles", nargs = "+", help = "Fasta files")
+    parser.add_argument("-p", "--processes", type = int, default = 1, help = "Number of files processed in parallel, default 1")
+    parser.add_argument("-m", "--mask", help = "Bed file with intervals to hard-mask before counting (e.g. rmsk2bed output)")
+    parser.add_argument("-o", "--output", help = "Output .info file, for one fasta file (default: FILENAME.info next to the fasta)")
+    args = parser.parse_args()
+
+    if args.infiles[0].endswith(tuple([".fasta", "fa", "fas", "fna"])):
+        infiles = args.infiles
+    else:
+        raise Exception("Invalid input arguments")
+
+    date = datetime.datetime.now()
+    assert not args.output or len(infiles) == 1, "--output takes one fasta file"
+    tasks = [(infile, args.output or info_filename(infile), date, 1 << 23, args.mask) for infile in infiles]
+
+    if args.processes > 1 and len(tasks) > 1:
+        with Pool(min(args.processes, len(tasks))) as pool:
+            for summary in pool.imap(_diagnose, tasks):
+                print(summary)
+    else:
+        for task in tasks:
+            print(_diagnose(task))
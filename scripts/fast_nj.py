@@ -0,0 +1,198 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Script to compute neighbour-joining (NJ) trees from pairwise distance matrices, for many windows in one process.
+Replaces skbio.nj + nw_reroot + concatenation of per-window newick files in the diversity pipeline.
+The NJ algorithm works on numpy arrays: the Q-matrix is computed in one vectorized step per join
+and all joins happen in place in one distance buffer, without building tree objects.
+Branch lengths follow skbio.nj (negative lengths are set to 0).
+With an outgroup, trees are rooted in the middle of the outgroup branch (like nw_reroot), otherwise
+they are written unrooted with a basal trifurcation.
+Input is a series of csv files generated with pairwise_pi.py (or a text file listing them),
+or a store generated with pairwise_pi_genome.py.
+Output is one newick tree per line, in the order of the windows. Windows with missing values get a 'NaN' line
+instead of a tree (as csv2nwk in the diversity Snakefile), so line numbers still match the windows.
+
+USAGE
+python3 fast_nj.py --help
+python3 fast_nj.py -l filenames.txt --outgroup Puma_concolor -o all_NJ.nwk
+or
+python3 fast_nj.py -i sum_pairwise_pi.csv --outgroup Puma_concolor -o sum_pairwise_pi.nwk
+or
+python3 fast_nj.py -s pairwise_pi.npz --outgroup PumCon1.0 -o all_NJ.nwk
+
+Created 18OCT26
+"""
+
+# Import modules
+import argparse
+import sys
+import numpy as np
+
+# Define functions
+def nj(distances, buffers = None):
+    # Returns the edges of the NJ tree of a square distance matrix, as a list of (node, node, branch length).
+    # Leaves are nodes 0 to n-1 in the order of the matrix, internal nodes are numbered from n onwards.
+    # buffers can hold a (distance, Q) pair of arrays of at least n x n, to be reused between calls.
+    n = len(distances)
+    assert n >= 3, "NJ needs at least three taxa"
+    if buffers is None or len(buffers[0]) < n:
+        buffers = (np.empty((n, n)), np.empty((n, n)))
+    d = buffers[0][:n, :n]
+    q = buffers[1][:n, :n]
+    d[:] = distances
+    nodes = list(range(n)) # node id at each position of the buffer
+    next_node = n
+    edges = []
+    m = n
+    while m > 3:
+        sub = d[:m, :m]
+        r = sub.sum(axis = 1)
+        q_sub = q[:m, :m]
+        np.multiply(sub, m - 2, out = q_sub)
+        q_sub -= r[:, None]
+        q_sub -= r[None, :]
+        np.fill_diagonal(q_sub, np.inf)
+        i, j = divmod(int(np.argmin(q_sub)), m)
+        if i > j:
+            i, j = j, i
+        d_ij = sub[i, j]
+        length_i = 0.5 * d_ij + (r[i] - r[j]) / (2 * (m - 2))
+        length_j = d_ij - length_i
+        edges.append((next_node, nodes[i], max(length_i, 0.0)))
+        edges.append((next_node, nodes[j], max(length_j, 0.0)))
+        # new node takes position i, the last position moves to j
+        new = 0.5 * (sub[i, :] + sub[j, :] - d_ij)
+        sub[i, :] = new
+        sub[:, i] = new
+        sub[i, i] = 0.0
+        last = m - 1
+        if j != last:
+            sub[j, :] = sub[last, :]
+            sub[:, j] = sub[:, last]
+            sub[j, j] = 0.0
+            nodes[j] = nodes[last]
+        nodes[i] = next_node
+        next_node += 1
+        m -= 1
+    # join the last three nodes to a central node
+    d_01, d_02, d_12 = d[0, 1], d[0, 2], d[1, 2]
+    edges.append((next_node, nodes[0], max(0.5 * (d_01 + d_02 - d_12), 0.0)))
+    edges.append((next_node, nodes[1], max(0.5 * (d_01 + d_12 - d_02), 0.0)))
+    edges.append((next_node, nodes[2], max(0.5 * (d_02 + d_12 - d_01), 0.0)))
+    return edges
+
+def edges2newick(edges, labels, outgroup = None):
+    # Returns a newick string for the edges made by nj.
+    # Rooted in the middle of the branch to the outgroup if given, else at the last internal node (unrooted).
+    neighbours = {}
+    for a, b, length in edges:
+        neighbours.setdefault(a, []).append((b, length))
+        neighbours.setdefault(b, []).append((a, length))
+
+    def subtree(node, parent):
+        # Iterative, so that large trees don't reach the recursion limit
+        stack = [(node, parent, False)]
+        done = {}
+        while stack:
+            current, previous, expanded = stack.pop()
+            children = [(child, length) for child, length in neighbours[current] if child != previous]
+            if not children:
+                done[current] = labels[current]
+            elif expanded:
+                done[current] = "(" + ",".join("{}:{}".format(done[child], repr(float(length))) for child, length in children) + ")"
+            else:
+                stack.append((current, previous, True))
+                stack.extend((child, current, False) for child, length in children)
+        return done[node]
+
+    if outgroup is None:
+        root = edges[-1][0]
+        return subtree(root, None) + ";"
+    leaf = labels.index(outgroup)
+    (neighbour, length), = neighbours[leaf]
+    half = repr(float(length) / 2)
+    return "(" + labels[leaf] + ":" + half + "," + subtree(neighbour, leaf) + ":" + half + ");"
+
+def nj_newick(distances, labels, outgroup = None, buffers = None):
+    # Returns the NJ tree of a square distance matrix as a newick string.
+    return edges2newick(nj(distances, buffers), list(labels), outgroup)
+
+def nj_batch(matrices, labels, outgroup = None):
+    # Returns a list of newick strings for a stack (or iterable) of distance matrices with the same labels, reusing buffers.
+    n = len(labels)
+    buffers = (np.empty((n, n)), np.empty((n, n)))
+    return [nj_newick(matrix, labels, outgroup, buffers) for matrix in matrices]
+
+def store_distance_matrices(store):
+    # Yields (window name, per-site pi matrix) for every window of a store made by pairwise_pi_genome.py.
+    # Matrices with pairs that lack valid sites hold NaN.
+    n = len(store["samples"])
+    matrix = np.zeros((n, n))
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        for window, differences, valid_sites in zip(store["windows"], store["differences"], store["valid_sites"]):
+            pi = np.where(valid_sites > 0, differences / valid_sites, np.nan)
+            matrix[store["pair_i"], store["pair_j"]] = pi
+            matrix[store["pair_j"], store["pair_i"]] = pi
+            yield str(window), matrix
+
+if __name__ == "__main__":
+    # Initialize parser
+    msg = "Compute NJ trees from pairwise distance matrices (csv files from pairwise_pi.py, or a store from pairwise_pi_genome.py), written one tree per line. If no output file specified, prints to std out."
+    parser = argparse.ArgumentParser(description = msg)
+
+    # Adding arguments
+    parser.add_argument("-l", "--list", metavar = "filenames.txt", help = "Textfile listing the absolute paths to input csv files. Don't use together with -i.")
+    parser.add_argument("-i", "--input", nargs = "+", metavar = "input.csv", help = "One or multiple input files in csv format. Don't use together with -l.")
+    parser.add_argument("-s", "--store", metavar = "pairwise_pi.npz", help = "Store made by pairwise_pi_genome.py. Don't use together with -i or -l.")
+    parser.add_argument("--outgroup", help = "Label of the outgroup to root the trees on. Trees are unrooted if not given.")
+    parser.add_argument("-t", "--threads", type = int, default = 4, help = "Number of threads reading csv files. Default 4.")
+    parser.add_argument("-o", "--output", help = "Absolute path to output file in newick format.")
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    if args.store:
+        from pairwise_pi_genome import load_store
+        store = load_store(args.store)
+        samples = [str(sample) for sample in store["samples"]]
+        windows = ((window, samples, matrix) for window, matrix in store_distance_matrices(store))
+    else:
+        from concurrent.futures import ThreadPoolExecutor
+        from pairwise_pi_sum import read_pi_csv
+        if args.list:
+            with open(args.list) as filelist:
+                infiles = [infile.strip() for infile in filelist if infile.strip()]
+        else:
+            infiles = args.input
+        pool = ThreadPoolExecutor(max_workers = args.threads)
+        windows = pool.map(read_pi_csv, infiles)
+
+    # Compute trees, writing 'NaN' for windows with missing values
+    out = open(args.output, "w") if args.output else sys.stdout
+    buffers = None
+    written = 0
+    missing = 0
+    labels = None
+    for window in windows:
+        if len(window) == 4: # csv file: (infile, ids, values, error)
+            infile, ids, matrix, error = window
+            if error:
+                raise Exception("Could not read {}: {}".format(infile, error))
+        else:
+            infile, ids, matrix = window
+        if labels is None:
+            labels = ids
+        assert ids == labels, "Window {} does not contain the same samples as the other windows".format(infile)
+        if np.isnan(matrix).any():
+            out.write("NaN\n")
+            missing += 1
+            continue
+        if buffers is None:
+            buffers = (np.empty(matrix.shape), np.empty(matrix.shape))
+        out.write(nj_newick(matrix, labels, args.outgroup, buffers) + "\n")
+        written += 1
+    if args.output:
+        out.close()
+    print("Wrote {} trees and {} NaN lines for windows with missing values".format(written, missing), file = sys.stderr)
@@ -3,16 +3,23 @@
 """
 DESCRIPTION
 Python script to convert a fasta files to a phylip file.
+In batch mode, converts a list (or folder) of fasta files in one process, with a pool of workers.
 
 USAGE
 python fasta2phylip.py --input [infile.fasta] --output [outfile.phy]
+python fasta2phylip.py --batch [filenames.txt or /fullpath/windows/] [--indir /fullpath/windows/] --outdir [/fullpath/phylip/] --processes 8
 Provide full paths.
 Make sure output file doesn't exist yet, else it will be overwritten.
+In batch mode, output files are named after the input files, with extension .phy.
+
+from fasta2phylip import fasta2phylip_file
 
 Author: Jonas Lescroart
 
 CHANGE LOG
 17SEP22: script created from fasta2phylipBPP.py 
+18OCT26: streaming conversion (fasta2phylip_file) without reading the whole file or concatenating strings,
+batch mode with --batch, --outdir and --processes, script can be imported. Output is identical.
 """
 
 #import modules
@@ -20,16 +27,7 @@ import os
 import string
 import re
 import argparse
-
-#take command line arguments
-parser = argparse.ArgumentParser()
-parser.add_argument('--input', help = "Absolute path to fasta file", type = str)
-parser.add_argument('--output', help = "Absolute path to phylip file", type = str)
-args = parser.parse_args()
-
-#assertions
-assert args.input.endswith(tuple([".fa", ".fasta", ".fna"])), "Provide a fasta file as input"
-assert args.output.endswith(tuple([".phy", ".phylip"])), "Provide a phylips filename as output"
+from multiprocessing import Pool
 
 #define functions
 def fasta2phylip(oldlines):
@@ -63,16 +61,80 @@ def fasta2phylip(oldlines):
     #return as list of lines
     return(newlines)
 
-#variables
-infile = args.input
-outfile = args.output
+def fasta2phylip_file(infile, outfile):
+    # Streaming version of fasta2phylip: converts infile to outfile with the same output.
+    # A first pass counts taxa and sequence length (of the last taxon with sequence data, like fasta2phylip),
+    # the second pass writes the sequence lines straight to the output. Returns the number of taxa and bp.
+    taxa = 0
+    bp = 0
+    current = 0
+    with open(infile, "r") as fasta:
+        for line in fasta:
+            if line.startswith(">"):
+                taxa += 1
+                current = max(len(line.replace(">", "").rstrip()) - 13, 0)
+            elif line.startswith(("A", "C", "G", "T", "N")):
+                current += len(line.rstrip())
+                bp = current
+    with open(infile, "r") as fasta, open(outfile + ".tmp", "w") as phylip:
+        phylip.write("   " + str(taxa) + "   " + str(bp)+ "\n")
+        for line in fasta:
+            if line.startswith(">"):
+                name = line.replace(">", "").rstrip()
+                phylip.write("\n" + name + " " * (13 - len(name)))
+            elif line.startswith(("A", "C", "G", "T", "N")):
+                phylip.write(line.replace("N", "?").rstrip())
+    os.replace(outfile + ".tmp", outfile)
+    return taxa, bp
 
-#convert
-fasta = open(infile, "r")
-fasta_lines = fasta.readlines()
-fasta.close()
+def _convert(args):
+    # Pool worker
+    infile, outfile = args
+    fasta2phylip_file(infile, outfile)
+    return outfile
 
-phylip = open(outfile, "w")
-phylip.write("".join(fasta2phylip(fasta_lines)))
-phylip.close()
+def batch_files(batch, outdir, indir = None):
+    # Returns (infile, outfile) for all fasta files in a folder, or for a text file listing fasta files one per line
+    # (e.g. filenames.txt of createWindow_aln_JL.py), relative paths taken from indir or else from the folder of the list
+    if os.path.isdir(batch):
+        infiles = sorted(os.path.join(batch, name) for name in os.listdir(batch) if name.endswith(tuple([".fa", ".fasta", ".fna"])))
+    else:
+        indir = indir if indir else os.path.dirname(os.path.abspath(batch))
+        with open(batch, "r") as filelist:
+            infiles = [os.path.join(indir, line.strip()) for line in filelist if line.strip()]
+    return [(infile, os.path.join(outdir, ".".join(os.path.basename(infile).split(".")[:-1]) + ".phy")) for infile in infiles]
+
+if __name__ == "__main__":
+    #take command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', help = "Absolute path to fasta file", type = str)
+    parser.add_argument('--output', help = "Absolute path to phylip file", type = str)
+    parser.add_argument('--batch', help = "Text file listing fasta files (one per line), or folder with fasta files. Use with --outdir", type = str)
+    parser.add_argument('--indir', help = "Absolute path to the folder with the fasta files listed in --batch, default the folder of the list", type = str)
+    parser.add_argument('--outdir', help = "Absolute path to output folder for --batch", type = str)
+    parser.add_argument('--processes', help = "Number of worker processes for --batch, default 1", type = int, default = 1)
+    args = parser.parse_args()
+
+    if args.batch:
+        #assertions
+        assert args.outdir, "Provide an output folder with --outdir"
+        if not os.path.exists(args.outdir):
+            os.makedirs(args.outdir)
+        tasks = batch_files(args.batch, args.outdir, args.indir)
+        for infile, outfile in tasks:
+            assert infile.endswith(tuple([".fa", ".fasta", ".fna"])), "Provide fasta files as input: " + infile
+
+        #convert
+        if args.processes > 1:
+            with Pool(args.processes) as pool:
+                converted = sum(1 for outfile in pool.imap_unordered(_convert, tasks, chunksize = 16))
+        else:
+            converted = sum(1 for outfile in map(_convert, tasks))
+        print("Converted {} files".format(converted))
+    else:
+        #assertions
+        assert args.input.endswith(tuple([".fa", ".fasta", ".fna"])), "Provide a fasta file as input"
+        assert args.output.endswith(tuple([".phy", ".phylip"])), "Provide a phylips filename as output"
 
+        #convert
+        fasta2phylip_file(args.input, args.output)
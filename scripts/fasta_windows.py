@@ -0,0 +1,237 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Functions to read genomes and window alignments in fasta format window by window,
+without holding whole chromosomes in memory.
+Window names follow bedtools makewindows + getfasta (chr:start-end, 0-based start, end exclusive),
+so they match the names of the window files made by createWindow_aln_JL.py.
+FaiFasta reads windows straight from a genome with a samtools faidx index (.fai), through a memory map:
+no parsing, no temporary copies of the genome, and any window of any genome in any order.
+read_mask_bed and mask_sequence hard-mask sequences (like bedtools maskfasta) on the fly, from intervals in a bed file.
+Not meant to be run, import functions in other scripts.
+
+USAGE
+from fasta_windows import iter_fasta_windows, iter_genome_windows, read_window
+from fasta_windows import FaiFasta, iter_fai_windows
+from fasta_windows import read_mask_bed, mask_sequence
+
+Created 18OCT26
+"""
+
+# Import modules
+import mmap
+import os
+from collections import OrderedDict
+import numpy as np
+
+# Define functions
+def sample_name(path):
+    # Returns the sample name of a genome file, the way createWindow_aln_JL.py does (file name without last extension).
+    return ".".join(os.path.basename(path).split(".")[:-1])
+
+def window_name(record_id, start, end):
+    # Returns the window name in bedtools getfasta style.
+    return "{}:{}-{}".format(record_id, start, end)
+
+def iter_fasta_blocks(infile, chunk_size = 1 << 23):
+    # Yields (record id, sequence bytes) blocks of a fasta file, read in chunks of chunk_size bytes.
+    # Newlines are removed. Every record starts with an empty block, so records without sequence are yielded too;
+    # the blocks that follow, up to the next empty block, belong to the same sequence.
+    record_id = None
+    header = None # bytearray while a header line is being read
+    with open(infile, "rb") as handle:
+        while True:
+            chunk = handle.read(chunk_size)
+            if not chunk:
+                break
+            pos = 0
+            while pos < len(chunk):
+                if header is not None:
+                    end = chunk.find(b"\n", pos)
+                    if end == -1:
+                        header += chunk[pos:]
+                        break
+                    header += chunk[pos:end]
+                    record_id = header.decode().split()[0]
+                    header = None
+                    pos = end + 1
+                    yield record_id, b""
+                else:
+                    start = chunk.find(b">", pos)
+                    end = len(chunk) if start == -1 else start
+                    block = chunk[pos:end].translate(None, b"\n\r")
+                    if block:
+                        assert record_id is not None, "File {} does not start with a fasta header".format(infile)
+                        yield record_id, block
+                    if start == -1:
+                        break
+                    header = bytearray()
+                    pos = start + 1
+        if header: # header on the last line, without newline
+            yield header.decode().split()[0], b""
+
+def iter_fasta_windows(infile, size):
+    # Yields (window name, sequence bytes) for consecutive windows of a fixed size along every sequence of a fasta file.
+    # The last window of a sequence is shorter, like with bedtools makewindows.
+    record_id = None
+    buffer = bytearray()
+    start = 0
+    for block_id, block in iter_fasta_blocks(infile):
+        if not block:
+            if buffer:
+                yield window_name(record_id, start, start + len(buffer)), bytes(buffer)
+            record_id = block_id
+            buffer = bytearray()
+            start = 0
+        buffer += block
+        while len(buffer) >= size:
+            yield window_name(record_id, start, start + size), bytes(buffer[:size])
+            del buffer[:size]
+            start += size
+    if buffer:
+        yield window_name(record_id, start, start + len(buffer)), bytes(buffer)
+
+def iter_genome_windows(infiles, size):
+    # Yields (window name, list of sequence bytes) for the same window in all genomes, reading the genomes in lockstep.
+    # The genomes must be consensus sequences on the same reference, i.e. same sequence names, order and lengths.
+    readers = [iter_fasta_windows(infile, size) for infile in infiles]
+    for windows in zip(*readers):
+        names = set(name for name, seq in windows)
+        assert len(names) == 1, "Genomes are not aligned to the same reference, found windows {}".format(sorted(names))
+        yield names.pop(), [seq for name, seq in windows]
+    for infile, reader in zip(infiles, readers):
+        assert next(reader, None) is None, "Genome {} has more windows than the other genomes".format(infile)
+
+def read_window(infile, sort_ids = True):
+    # Returns the sequence ids and sequences (bytes) of one window alignment in fasta format, sorted by id unless sort_ids is False.
+    records = {}
+    record_id = None
+    with open(infile, "rb") as handle:
+        for line in handle:
+            if line.startswith(b">"):
+                record_id = line[1:].decode().split()[0]
+                records[record_id] = []
+            elif record_id is not None:
+                records[record_id].append(line.rstrip())
+    ids = sorted(records) if sort_ids else list(records)
+    return ids, [b"".join(records[id]) for id in ids]
+
+def read_fai(infile):
+    # Returns the records of a .fai index as OrderedDict: name -> (length, offset, bases per line, bytes per line)
+    index = OrderedDict()
+    with open(infile) as fai:
+        for line in fai:
+            if line.strip():
+                fields = line.split("\t")
+                index[fields[0]] = tuple(int(field) for field in fields[1:5])
+    return index
+
+def make_windows(index, size):
+    # Returns (record id, start, end) of fixed-size windows along every record of a .fai index, like bedtools makewindows -w
+    return [(name, start, min(start + size, length)) for name, (length, offset, linebases, linewidth) in index.items() for start in range(0, length, size)]
+
+class FaiFasta(object):
+    # Random access to the sequences of a fasta file with a .fai index (samtools faidx), through a read-only memory map.
+    # Every record is a lines x bases array view on the map (no copy, newlines skipped by the stride), so a window
+    # is one slice of that view; it is copied once, when its bytes are returned.
+    def __init__(self, path, fai = None):
+        self.path = path
+        self.index = read_fai(fai or path + ".fai")
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+        self._bytes = np.frombuffer(self._map, dtype = np.uint8)
+        self._records = {}
+
+    def _record(self, name):
+        # Returns the view of the full lines and the view of the last, shorter line of a record
+        if name not in self._records:
+            length, offset, linebases, linewidth = self.index[name]
+            full = length // linebases
+            # the last full line can end the file without its newline, so the view stops after its last base
+            span = full * linewidth - (linewidth - linebases) if full else 0
+            lines = np.lib.stride_tricks.as_strided(self._bytes[offset:offset + span], shape = (full, linebases), strides = (linewidth, 1), writeable = False)
+            rest = self._bytes[offset + full * linewidth:offset + full * linewidth + length % linebases]
+            self._records[name] = (lines, rest)
+        return self._records[name]
+
+    def fetch(self, name, start, end):
+        # Returns the sequence (bytes) of record name from start to end (0-based, end exclusive, like bed)
+        length, offset, linebases, linewidth = self.index[name]
+        end = min(end, length)
+        lines, rest = self._record(name)
+        first = start // linebases
+        last = min(-(-end // linebases), len(lines))
+        seq = lines[first:last].tobytes()[start - first * linebases:end - first * linebases]
+        if end > len(lines) * linebases:
+            seq += rest[max(start - len(lines) * linebases, 0):end - len(lines) * linebases].tobytes()
+        return seq
+
+    def close(self):
+        self._records = {}
+        self._bytes = None
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def open_fai_genomes(infiles):
+    # Returns FaiFasta objects for genomes on the same reference (same record names, order and lengths in the .fai)
+    genomes = [FaiFasta(infile) for infile in infiles]
+    records = [(name, values[0]) for name, values in genomes[0].index.items()]
+    for genome in genomes[1:]:
+        if [(name, values[0]) for name, values in genome.index.items()] != records:
+            raise Exception("Genome {} has other records or lengths than {}".format(genome.path, genomes[0].path))
+    return genomes
+
+def iter_fai_windows(infiles, size):
+    # Yields (window name, list of sequence bytes) for the same window in all genomes, read through their .fai indexes.
+    # Same windows and names as iter_genome_windows, or bedtools makewindows + getfasta.
+    genomes = open_fai_genomes(infiles)
+    try:
+        for record_id, start, end in make_windows(genomes[0].index, size):
+            yield window_name(record_id, start, end), [genome.fetch(record_id, start, end) for genome in genomes]
+    finally:
+        for genome in genomes:
+            genome.close()
+
+def read_mask_bed(infile):
+    # Returns the intervals of a bed file (e.g. rmsk2bed output) per chromosome as sorted, merged (starts, ends) int64 arrays
+    chromosomes = OrderedDict()
+    with open(infile) as bed:
+        for line in bed:
+            if not line.strip() or line.startswith(("#", "track", "browser")):
+                continue
+            fields = line.split("\t", 3)
+            chromosomes.setdefault(fields[0], []).append((int(fields[1]), int(fields[2])))
+    intervals = {}
+    for chromosome, pairs in chromosomes.items():
+        pairs = np.array(sorted(pairs), dtype = np.int64)
+        starts, ends = pairs[:, 0], np.maximum.accumulate(pairs[:, 1])
+        new = np.ones(len(pairs), dtype = bool)
+        new[1:] = starts[1:] > ends[:-1] # an interval that starts after all earlier ones end starts a new merged interval
+        groups = np.flatnonzero(new)
+        intervals[chromosome] = (starts[groups], np.append(ends[groups[1:] - 1], ends[-1]))
+    return intervals
+
+def mask_sequence(seq, intervals, start = 0, char = b"N"):
+    # Returns seq (bytes, starting at position start of its chromosome) with the positions in intervals (from read_mask_bed) replaced by char.
+    # seq is returned as is if no interval overlaps it.
+    if intervals is None:
+        return seq
+    starts, ends = intervals
+    end = start + len(seq)
+    first = np.searchsorted(ends, start, side = "right")
+    last = np.searchsorted(starts, end, side = "left")
+    if first >= last:
+        return seq
+    buffer = np.frombuffer(bytearray(seq), dtype = np.uint8)
+    change = np.zeros(len(seq) + 1, dtype = np.int64)
+    np.add.at(change, np.clip(starts[first:last] - start, 0, len(seq)), 1)
+    np.add.at(change, np.clip(ends[first:last] - start, 0, len(seq)), -1)
+    buffer[np.cumsum(change[:-1]) > 0] = ord(char)
+    return buffer.tobytes()
@@ -9,33 +9,26 @@ python generate_ctlMCMC.py --phy [infile.phy] --nwk [infile.nwk] --ctl [outfile.
 Provide absolute paths.
 Run script with -h for help.
 
+from generate_ctlMCMC import write_ctl
+
 AUTHOR
 Jonas Lescroart
 17SEP22
+18OCT26: control file written by function write_ctl, so it can be imported (see batch_worker.py)
 """
 
 #import modules
 import argparse
 
-#command line arguments
-parser = argparse.ArgumentParser()
-parser.add_argument('--phy', help="Absolute path to phylip file", type= str)
-parser.add_argument('--nwk', help="Absolute path to corresponding tree file", type= str)
-parser.add_argument('--ctl', help="Absolute path to output control file", type= str)
-args = parser.parse_args()
-
-#assertions
-assert args.phy.endswith(tuple([".phy", ".phylip"])), "usage: python generate_ctlMCMC.py [-h] [--phy PHY] [--nwk NWK] [--ctl CTL]"
-assert args.nwk, "usage: python generate_ctlMCMC.py [-h] [--phy PHY] [--nwk NWK] [--ctl CTL]"
-assert args.ctl, "usage: python generate_ctlMCMC.py [-h] [--phy PHY] [--nwk NWK] [--ctl CTL]"
-
-#write control file
-with open(args.ctl, "w") as file:
-    file.write("""          seed =  -1
-       seqfile = """+args.phy+"""
-      treefile = """+args.nwk+"""
-       outfile = """+(".").join(args.ctl.split(".")[:-1])+"""_out.txt
-      mcmcfile = """+(".").join(args.ctl.split(".")[:-1])+"""_mcmc.txt
+#define functions
+def write_ctl(phy, nwk, ctl):
+    # Writes the MCMCTree control file ctl for alignment phy and tree nwk
+    with open(ctl, "w") as file:
+        file.write("""          seed =  -1
+       seqfile = """+phy+"""
+      treefile = """+nwk+"""
+       outfile = """+(".").join(ctl.split(".")[:-1])+"""_out.txt
+      mcmcfile = """+(".").join(ctl.split(".")[:-1])+"""_mcmc.txt
 
          ndata = 1  * number of loci
        seqtype = 0  * 0: nucleotides; 1:codons; 2:AAs
@@ -64,3 +57,18 @@ with open(args.ctl, "w") as file:
 *   checkpoint = 0  * 0: nothing; 1 : save; 2: resume
        nsample = 2000""")
 
+if __name__ == "__main__":
+    #command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--phy', help="Absolute path to phylip file", type= str)
+    parser.add_argument('--nwk', help="Absolute path to corresponding tree file", type= str)
+    parser.add_argument('--ctl', help="Absolute path to output control file", type= str)
+    args = parser.parse_args()
+
+    #assertions
+    assert args.phy.endswith(tuple([".phy", ".phylip"])), "usage: python generate_ctlMCMC.py [-h] [--phy PHY] [--nwk NWK] [--ctl CTL]"
+    assert args.nwk, "usage: python generate_ctlMCMC.py [-h] [--phy PHY] [--nwk NWK] [--ctl CTL]"
+    assert args.ctl, "usage: python generate_ctlMCMC.py [-h] [--phy PHY] [--nwk NWK] [--ctl CTL]"
+
+    #write control file
+    write_ctl(args.phy, args.nwk, args.ctl)
@@ -1,12 +1,21 @@
 import sys
 
-filename=sys.argv[1]
+def het_values(filename):
+    # Returns the lines "heterozygosity<TAB>sample" for a folded SFS (.est.ml) from realSFS
+    # (importable, see batch_worker.py)
+    values = []
+    with open(filename) as f:
+        lines = f.readlines()
+        for i in lines:
+            i=i.split()
+            sum_values=float(i[0]) + float(i[1])
+            het=float(i[1])/sum_values
+            sample=filename.split("/")[-1][:-7]
+            values.append(str('{:.15f}'.format(het))+"\t"+sample)
+    return values
 
-with open(filename) as f:
-    lines = f.readlines()
-    for i in lines:
-        i=i.split()
-        sum_values=float(i[0]) + float(i[1])
-        het=float(i[1])/sum_values
-        sample=filename.split("/")[-1][:-7]
-        print(str('{:.15f}'.format(het))+"\t"+sample)
+if __name__ == "__main__":
+    filename=sys.argv[1]
+
+    for line in het_values(filename):
+        print(line)
@@ -1,46 +1,174 @@
-#!/usr/bin/python
+#!/usr/bin/env python3
 # encoding:utf8
 # authors: Erik Garrison, Sébastien Boisvert
 # modified by github@cypridina on 20151104 to work with MITObim
+# modified on 18OCT26 for python 3: bytes, blocks of reads, mates decompressed in separate threads,
+# only header lines rewritten, mate names checked, buffered writer thread, optional gzip output
 # See also: https://github.com/chrishah/MITObim
 """This script takes two fastq or fastq.gz files and interleaves them
 Usage:
-    interleave-fasta fasta_file1 fasta_file2
+    interleave-fastqgz-MITOBIM.py fastq_file1 fastq_file2 > interleaved.fastq
+    interleave-fastqgz-MITOBIM.py fastq_file1 fastq_file2 -o interleaved.fastq[.gz]
 """
 
-import sys,re 
+import argparse
+import gzip
+import io
+import queue
+import sys
+import threading
+from itertools import islice
 
-def interleave(f1, f2):
-    """Interleaves two (open) fastq files.
+def open_fastq(path):
+    """Opens a fastq or fastq.gz file for reading bytes, with a large buffer.
     """
+    if path.endswith("gz"):
+        return io.BufferedReader(gzip.open(path, "rb"), buffer_size = 1 << 22)
+    return open(path, "rb", buffering = 1 << 22)
+
+def read_blocks(path, reads, out):
+    """Puts blocks of lines (reads x 4 lines) of a fastq file on queue out, then None.
+    Runs in its own thread, decompression releases the GIL.
+    """
+    try:
+        with open_fastq(path) as handle:
+            while True:
+                block = list(islice(handle, 4 * reads))
+                if not block:
+                    break
+                out.put(block)
+    except Exception as error:
+        out.put(error)
+    out.put(None)
+
+def threaded_blocks(path, reads = 100000):
+    """Yields the blocks of lines of a fastq file, read ahead in a thread.
+    """
+    blocks = queue.Queue(maxsize = 4)
+    thread = threading.Thread(target = read_blocks, args = (path, reads, blocks), daemon = True)
+    thread.start()
     while True:
-        line = f1.readline()
-        if line.strip() == "":
+        block = blocks.get()
+        if block is None:
             break
-        print re.sub(r" 1:N.*", "/1",line.strip())
-        
-        for i in xrange(3):
-            print re.sub(r" 2:N.*","/2",f1.readline().strip())
-        
-        for i in xrange(4):
-            print re.sub(r" 2:N.*","/2",f2.readline().strip())
+        if isinstance(block, Exception):
+            raise block
+        yield block
+    thread.join()
 
-if __name__ == '__main__':
+def rename(line, mate):
+    """Replaces ' 1:N...' (or ' 2:N...') at the end of a header line by /1 (or /2), like MITObim expects.
+    """
+    line = line.rstrip(b"\r\n")
+    cut = line.find(b" " + mate + b":N")
+    if cut != -1:
+        line = line[:cut] + b"/" + mate
+    return line + b"\n"
+
+def read_name(header):
+    """Returns the read name of a header line, without @ and mate suffix.
+    """
+    name = header[1:].split(None, 1)[0]
+    if name.endswith((b"/1", b"/2")):
+        name = name[:-2]
+    return name
+
+def interleave_block(block1, block2, count):
+    """Returns the interleaved reads of two blocks as one bytes object. count is the number of reads before the blocks, for error messages.
+    """
+    assert len(block1) == len(block2), "Mate files have a different number of reads (near read {})".format(count + min(len(block1), len(block2)) // 4)
+    assert len(block1) % 4 == 0, "Truncated fastq record near read {}".format(count + len(block1) // 4)
+    if not block1[-1].endswith(b"\n"):
+        block1[-1] += b"\n"
+    if not block2[-1].endswith(b"\n"):
+        block2[-1] += b"\n"
+    lines = []
+    for i in range(0, len(block1), 4):
+        header1 = block1[i]
+        header2 = block2[i]
+        if read_name(header1) != read_name(header2):
+            raise Exception("Mates out of sync at read {}: {} and {}".format(count + i // 4 + 1, header1.strip().decode(), header2.strip().decode()))
+        lines.append(rename(header1, b"1"))
+        lines.append(block1[i + 1])
+        lines.append(block1[i + 2] if block1[i + 2] == b"+\n" else rename(block1[i + 2], b"2"))
+        lines.append(block1[i + 3])
+        lines.append(rename(header2, b"2"))
+        lines.append(block2[i + 1])
+        lines.append(block2[i + 2] if block2[i + 2] == b"+\n" else rename(block2[i + 2], b"2"))
+        lines.append(block2[i + 3])
+    return b"".join(lines)
+
+def write_blocks(handle, blocks, errors):
+    """Writes bytes objects from queue blocks to handle until None. Runs in its own thread.
+    An exception (disk full, broken pipe) is appended to the list errors and stops the thread.
+    """
     try:
-        file1 = sys.argv[1]
-        file2 = sys.argv[2]
-    except:
-        print __doc__
-        sys.exit(1)
-
-    if file1[-2:] == "gz":
-        import gzip
-        with gzip.open(file1) as f1:
-            with gzip.open(file2) as f2:
-                interleave(f1, f2)
+        while True:
+            data = blocks.get()
+            if data is None:
+                break
+            handle.write(data)
+    except Exception as error:
+        errors.append(error)
+
+def put_block(blocks, data, writer, errors):
+    """Puts data on queue blocks for the writer thread. Raises the exception of the writer if it failed,
+    instead of waiting forever for room on the queue.
+    """
+    while True:
+        if errors:
+            raise errors[0]
+        try:
+            blocks.put(data, timeout = 1)
+            return
+        except queue.Full:
+            if not writer.is_alive():
+                raise errors[0] if errors else Exception("Writer thread stopped")
+
+def interleave(file1, file2, out, reads = 100000):
+    """Interleaves two fastq(.gz) files into the open binary file out. Returns the number of read pairs.
+    """
+    blocks = queue.Queue(maxsize = 4)
+    errors = []
+    writer = threading.Thread(target = write_blocks, args = (out, blocks, errors), daemon = True)
+    writer.start()
+    count = 0
+    try:
+        mates2 = threaded_blocks(file2, reads)
+        for block1 in threaded_blocks(file1, reads):
+            block2 = next(mates2, [])
+            put_block(blocks, interleave_block(block1, block2, count), writer, errors)
+            count += len(block1) // 4
+        assert next(mates2, None) is None, "Mate files have a different number of reads (after read {})".format(count)
+    finally:
+        while writer.is_alive():
+            try:
+                blocks.put(None, timeout = 1)
+                break
+            except queue.Full:
+                pass
+        writer.join()
+    if errors:
+        raise errors[0]
+    return count
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("file1", help = "fastq(.gz) with first mates")
+    parser.add_argument("file2", help = "fastq(.gz) with second mates")
+    parser.add_argument("-o", "--output", help = "Output file, gzip compressed if it ends with .gz (default: standard output)")
+    parser.add_argument("--reads", type = int, default = 100000, help = "Reads per block (default 100000)")
+    args = parser.parse_args()
+
+    if args.output and args.output.endswith(".gz"):
+        out = gzip.open(args.output, "wb", compresslevel = 1)
+    elif args.output:
+        out = open(args.output, "wb", buffering = 1 << 22)
+    else:
+        out = sys.stdout.buffer
+    pairs = interleave(args.file1, args.file2, out, args.reads)
+    if args.output:
+        out.close()
     else:
-        with open(file1) as f1:
-            with open(file2) as f2:
-                interleave(f1, f2)
-    f1.close()
-    f2.close() 
+        out.flush()
+    print("Interleaved {} read pairs".format(pairs), file = sys.stderr)
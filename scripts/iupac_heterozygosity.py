@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Script to estimate heterozygosity per window and genome-wide from consensus genomes with IUPAC ambiguity codes
+(ANGSD -doFasta 4, made by the bam2fasta pipeline), for all samples in one pass.
+Heterozygous sites are the two-base ambiguity codes (R, Y, S, W, K, M), callable sites are those plus A, C, G and T.
+Other characters (N, gaps, three-base codes) are not callable.
+The genomes must be consensus sequences on the same reference, they are read in lockstep window by window.
+Genome-wide heterozygosity is summed heterozygous sites divided by summed callable sites, with a weighted
+delete-one-block jackknife (Busing et al. 1999) over blocks of windows for the standard error and 95% interval.
+
+Output:
+PREFIX.windows.tsv  per window and sample: het_sites, callable_sites, heterozygosity
+PREFIX.tsv          per sample: het_sites, callable_sites, heterozygosity, jackknife_se, ci_low, ci_high, blocks
+
+USAGE
+python3 iupac_heterozygosity.py --help
+python3 iupac_heterozygosity.py --genomes sample1.fa sample2.fa ... --size 100000 --chromosomes autosomes.txt --output /fullpath/iupac_heterozygosity
+
+Created 18OCT26
+"""
+
+# Import modules
+import argparse
+import sys
+import numpy as np
+from multiprocessing import Pool
+from fasta_windows import sample_name, iter_genome_windows
+
+# Define functions
+HET_CODES = b"RYSWKM"
+CALLABLE_CODES = b"ACGT" + HET_CODES
+
+def lookup_table(codes):
+    # Returns a 256-entry boolean table that is True for the given symbols, in upper and lower case
+    table = np.zeros(256, dtype = bool)
+    table[np.frombuffer(codes, dtype = np.uint8)] = True
+    table[np.frombuffer(codes.lower(), dtype = np.uint8)] = True
+    return table
+
+HET = lookup_table(HET_CODES)
+CALLABLE = lookup_table(CALLABLE_CODES)
+
+def window_het_counts(seqs):
+    # Returns the heterozygous and callable sites per sequence (int64 arrays) of one window.
+    matrix = np.frombuffer(b"".join(seqs), dtype = np.uint8).reshape(len(seqs), -1)
+    return HET[matrix].sum(axis = 1, dtype = np.int64), CALLABLE[matrix].sum(axis = 1, dtype = np.int64)
+
+def _window_het_counts(args):
+    # Pool worker
+    name, seqs = args
+    het, callable_sites = window_het_counts(seqs)
+    return name, het, callable_sites
+
+def window_chromosome(name):
+    # Returns the chromosome of a window name (chr:start-end)
+    return name.rsplit(":", 1)[0]
+
+def block_ids(windows, block_size):
+    # Returns the block number of every window: consecutive windows on the same chromosome, block_size windows per block
+    blocks = []
+    block = -1
+    previous = None
+    in_block = 0
+    for name in windows:
+        chromosome = window_chromosome(name)
+        if chromosome != previous or in_block == block_size:
+            block += 1
+            in_block = 0
+            previous = chromosome
+        blocks.append(block)
+        in_block += 1
+    return np.array(blocks, dtype = np.int64)
+
+def block_jackknife(het, callable_sites):
+    # Weighted delete-one-block jackknife of the ratio het/callable (Busing et al. 1999).
+    # Takes blocks x samples arrays of heterozygous and callable sites.
+    # Returns the estimate, standard error and number of blocks used per sample. Blocks without callable sites are left out.
+    het = het.astype(np.float64)
+    callable_sites = callable_sites.astype(np.float64)
+    used = callable_sites > 0
+    n = callable_sites.sum(axis = 0)
+    g = used.sum(axis = 0)
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        theta = het.sum(axis = 0) / n
+        theta_minus = (het.sum(axis = 0) - het) / (n - callable_sites)
+        h = n / callable_sites
+        theta_jack = g * theta - np.where(used, (1 - callable_sites / n) * theta_minus, 0).sum(axis = 0)
+        pseudo = h * theta - (h - 1) * theta_minus
+        variance = np.where(used & (h > 1), (pseudo - theta_jack) ** 2 / (h - 1), 0).sum(axis = 0) / g
+    se = np.sqrt(variance)
+    se[g < 2] = np.nan
+    return theta, se, g
+
+def read_chromosomes(infile):
+    # Returns the chromosome names in the first column of a text file (e.g. autosomes.txt)
+    with open(infile) as chromosomes:
+        return set(line.split()[0] for line in chromosomes if line.strip())
+
+if __name__ == "__main__":
+    # Initialize parser
+    msg = "Heterozygosity per window and genome-wide, with block jackknife intervals, from IUPAC consensus genomes (ANGSD -doFasta 4)."
+    parser = argparse.ArgumentParser(description = msg)
+
+    # Adding arguments
+    parser.add_argument("-g", "--genomes", nargs = "+", required = True, metavar = "sample.fa", help = "IUPAC consensus genomes in fasta format, one per sample, on the same reference.")
+    parser.add_argument("-s", "--size", type = int, default = 100000, help = "Window size in bp. Default 100000.")
+    parser.add_argument("-b", "--block", type = int, default = 50, help = "Number of consecutive windows per jackknife block. Default 50 (5 Mb with 100 kb windows).")
+    parser.add_argument("-c", "--chromosomes", metavar = "autosomes.txt", help = "Text file with the chromosomes to use in the first column. Default all.")
+    parser.add_argument("-p", "--processes", type = int, default = 1, help = "Number of worker processes. Default 1.")
+    parser.add_argument("-o", "--output", required = True, metavar = "/fullpath/PREFIX", help = "Output prefix, writes PREFIX.tsv and PREFIX.windows.tsv.")
+
+    # Read arguments from command line
+    args = parser.parse_args()
+    samples = [sample_name(genome) for genome in args.genomes]
+    chromosomes = read_chromosomes(args.chromosomes) if args.chromosomes else None
+    windows = iter_genome_windows(args.genomes, args.size)
+    if chromosomes is not None:
+        windows = ((name, seqs) for name, seqs in windows if window_chromosome(name) in chromosomes)
+
+    # Count heterozygous and callable sites per window, write the window table as we go
+    names = []
+    het = []
+    callable_sites = []
+    with open(args.output + ".windows.tsv", "w") as out:
+        out.write("chromosome\tstart\tend\tsample\thet_sites\tcallable_sites\theterozygosity\n")
+        pool = Pool(args.processes) if args.processes > 1 else None
+        results = pool.imap(_window_het_counts, windows, chunksize = 8) if pool else map(_window_het_counts, windows)
+        for name, window_het, window_callable in results:
+            names.append(name)
+            het.append(window_het)
+            callable_sites.append(window_callable)
+            chromosome, span = name.rsplit(":", 1)
+            start, end = span.split("-")
+            for sample, sample_het, sample_callable in zip(samples, window_het, window_callable):
+                value = "{:.6g}".format(sample_het / sample_callable) if sample_callable else "NA"
+                out.write("{}\t{}\t{}\t{}\t{}\t{}\t{}\n".format(chromosome, start, end, sample, sample_het, sample_callable, value))
+        if pool:
+            pool.close()
+            pool.join()
+    assert names, "No windows found" + (" on the chromosomes in " + args.chromosomes if args.chromosomes else "")
+
+    # Genome-wide heterozygosity with block jackknife
+    het = np.array(het)
+    callable_sites = np.array(callable_sites)
+    blocks = block_ids(names, args.block)
+    block_het = np.zeros((blocks[-1] + 1, len(samples)), dtype = np.int64)
+    block_callable = np.zeros((blocks[-1] + 1, len(samples)), dtype = np.int64)
+    np.add.at(block_het, blocks, het)
+    np.add.at(block_callable, blocks, callable_sites)
+    theta, se, used = block_jackknife(block_het, block_callable)
+
+    with open(args.output + ".tsv", "w") as out:
+        out.write("sample\thet_sites\tcallable_sites\theterozygosity\tjackknife_se\tci_low\tci_high\tblocks\n")
+        for i, sample in enumerate(samples):
+            out.write("{}\t{}\t{}\t{:.6g}\t{:.6g}\t{:.6g}\t{:.6g}\t{}\n".format(sample, block_het[:, i].sum(), block_callable[:, i].sum(),
+                theta[i], se[i], theta[i] - 1.96 * se[i], theta[i] + 1.96 * se[i], used[i]))
+    print("Processed {} windows in {} blocks for {} samples".format(len(names), len(block_het), len(samples)), file = sys.stderr)
@@ -1,5 +1,6 @@
 ### Code from Hannes Svardal received on 14MAY2021.
 ### Additions by Jonas Lescroart on 09SEP21 and 22MAY23.
+### 18OCT26: added get_bootstrap_support_fast, replicates from one matrix product and NJ in a process pool, support counted with bipartition bitmasks.
 ### Computes neighborjoining tree from pairwaise distance matrix in python, with bootstrapping.
 ### To import functions from this file to a python environment: from matrix2NJ_bootstrap_HS.py import *
 
@@ -16,6 +17,7 @@ import skbio
 import numpy as np
 import sys
 import io
+from multiprocessing import Pool
 #sys.path.append('/media/labgenoma4/DATAPART4/jonasl/bin/') # Do only once
 from pypopgen3.modules import treetools
 
@@ -71,6 +73,152 @@ def get_bootstrap_support(real_tree, pwd_window, n_bootstrap_samples, outgroup):
     support_s.name = "Percentage bootstrap support"
     return support_tree, support_s
 
+def pwd_array_from_windows(pwd_window):
+    # Converts the pairs x windows DataFrame below (stacked distance matrices) to sample names, the index pairs (i < j)
+    # and a float32 pairs x windows array. Missing values count as 0, as in pwd_window.sum().
+    names = list(pwd_window.index.get_level_values(0).unique())
+    pair_i, pair_j = np.triu_indices(len(names), k = 1)
+    rows = pwd_window.loc[[(names[i], names[j]) for i, j in zip(pair_i, pair_j)]]
+    return names, pair_i, pair_j, np.nan_to_num(rows.values.astype(np.float32))
+
+def bootstrap_distance_matrices(pwd_array, n_bootstrap_samples, seed = None, valid_array = None, pair_names = None):
+    # Returns an n_bootstrap_samples x pairs array (float32) with the distances of every bootstrap replicate.
+    # All replicates are drawn at once as multinomial counts over windows (the same as resampling windows with replacement)
+    # and applied to the pairs x windows array with a single matrix product.
+    # If valid_array (pairs x windows, valid sites) is given, pwd_array holds differences and each replicate is the
+    # weighted per-site distance sum(differences)/sum(valid sites). A replicate that draws no valid sites for a pair
+    # has no distance for it: that raises an error naming the pair (pair_names, one label per pair, if given).
+    # Replicate k only depends on the seed, not on how the replicates are later divided over processes.
+    n_windows = pwd_array.shape[1]
+    rng = np.random.default_rng(seed)
+    weights = rng.multinomial(n_windows, np.full(n_windows, 1 / n_windows), size = n_bootstrap_samples).astype(np.float32)
+    distances = weights @ pwd_array.T
+    if valid_array is not None:
+        valid_sites = weights @ valid_array.T
+        empty = valid_sites <= 0
+        if empty.any():
+            pair = int(np.flatnonzero(empty.any(axis = 0))[0])
+            label = pair_names[pair] if pair_names is not None else "number " + str(pair)
+            raise ValueError("Pair {} has no valid sites in {} of {} bootstrap replicates".format(label, int(empty[:, pair].sum()), n_bootstrap_samples))
+        np.divide(distances, valid_sites, out = distances, where = ~empty)
+    return distances
+
+def leaf_key(name):
+    # Returns a leaf name as written in newick by skbio (spaces become underscores), to look up its bit.
+    return str(name).replace(" ", "_")
+
+def leaf_bitmasks(names):
+    # Returns a dictionary with one bit (integer) per leaf name, keyed by leaf_key.
+    leaf_bits = {leaf_key(name): 1 << i for i, name in enumerate(names)}
+    assert len(leaf_bits) == len(names), "Sample names are not unique once spaces are replaced by underscores: {}".format(", ".join(str(name) for name in names))
+    return leaf_bits
+
+def canonical_split(mask, full_mask, root_bit):
+    # Returns the side of a bipartition that doesn't hold the root leaf (e.g. the outgroup),
+    # so that a clade and its complement, i.e. the same split in a rooted or unrooted tree, get the same key.
+    return full_mask ^ mask if mask & root_bit else mask
+
+def tree_bipartitions(tree, leaf_bits, root_bit):
+    # Returns a list with the split key of every internal node (except the root) of an ete3/HsTree tree, in iter_descendants order.
+    full_mask = sum(leaf_bits.values())
+    masks = {}
+    for node in tree.traverse("postorder"):
+        if node.is_leaf():
+            masks[node] = leaf_bits[leaf_key(node.name)]
+        else:
+            masks[node] = sum(masks[child] for child in node.children)
+    return [canonical_split(masks[node], full_mask, root_bit) for node in tree.iter_descendants() if not node.is_leaf()]
+
+def newick_bipartitions(newick, leaf_bits, root_bit):
+    # Returns the set of split keys of all non-trivial bipartitions in a newick string, without building a tree object.
+    # Works for rooted and unrooted trees. Leaf names may be quoted, as in the output of skbio.nj.
+    full_mask = sum(leaf_bits.values())
+    splits = set([full_mask ^ root_bit]) # the split between root leaf and the rest is in every tree
+    stack = [0]
+    i = 0
+    while i < len(newick):
+        char = newick[i]
+        if char == "(":
+            stack.append(0)
+            i += 1
+        elif char == ")":
+            mask = stack.pop()
+            stack[-1] |= mask
+            split = canonical_split(mask, full_mask, root_bit)
+            if split & (split - 1): # more than one leaf
+                splits.add(split)
+            i += 1
+            while i < len(newick) and newick[i] not in ",();": # skip internal node label and branch length
+                i += 1
+        elif char in ",;" or char.isspace():
+            i += 1
+        else:
+            if char == "'":
+                end = newick.index("'", i + 1)
+                name = newick[i + 1:end]
+                i = end + 1
+            else:
+                end = i
+                while end < len(newick) and newick[end] not in ":,();":
+                    end += 1
+                name = newick[i:end].strip()
+                i = end
+            assert leaf_key(name) in leaf_bits, "Leaf {} of the bootstrap tree is not one of the samples".format(name)
+            stack[-1] |= leaf_bits[leaf_key(name)]
+            while i < len(newick) and newick[i] not in ",();": # skip branch length
+                i += 1
+    return splits
+
+def _init_support_worker(names, pair_i, pair_j, node_splits, root_bit):
+    # Pool initializer: shares the labels and the clades of the reference tree with the worker processes once.
+    global _support_args
+    _support_args = (names, pair_i, pair_j, node_splits, root_bit)
+
+def _replicate_support(distances):
+    # Pool worker: computes the NJ tree of one bootstrap replicate and returns for each clade of the reference tree whether it is present.
+    # Clades are compared as bipartition bitmasks, so the replicate tree needs no rooting or tree object.
+    names, pair_i, pair_j, node_splits, root_bit = _support_args
+    matrix = np.zeros((len(names), len(names)))
+    matrix[pair_i, pair_j] = distances
+    matrix += matrix.T
+    distance_matrix = skbio.DistanceMatrix(matrix, ids=names)
+    nj_newick = skbio.nj(distance_matrix, result_constructor=str)
+    splits = newick_bipartitions(nj_newick, leaf_bitmasks(names), root_bit)
+    return [split in splits for split in node_splits]
+
+def get_bootstrap_support_fast(real_tree, pwd_window, n_bootstrap_samples, outgroup, processes = 4, seed = None):
+    # Same output as get_bootstrap_support, but all replicate distance matrices come from one matrix product
+    # (bootstrap_distance_matrices) and the NJ trees and support scoring run in a pool of worker processes.
+    # Support is counted with bipartition bitmasks: the clades of real_tree are encoded once, replicate trees are read straight from newick.
+    # pwd_window is either the pairs x windows DataFrame below, or a store made by pairwise_pi_genome.py (see load_store).
+    support_dic = {}
+    support_tree = copy.deepcopy(real_tree)
+    if isinstance(pwd_window, dict):
+        names = [str(name) for name in pwd_window["samples"]]
+        pair_i, pair_j = pwd_window["pair_i"], pwd_window["pair_j"]
+        distances = bootstrap_distance_matrices(pwd_window["differences"].T.astype(np.float32), n_bootstrap_samples, seed,
+            valid_array = pwd_window["valid_sites"].T.astype(np.float32), pair_names = [names[i] + " - " + names[j] for i, j in zip(pair_i, pair_j)])
+    else:
+        names, pair_i, pair_j, pwd_array = pwd_array_from_windows(pwd_window)
+        distances = bootstrap_distance_matrices(pwd_array, n_bootstrap_samples, seed)
+
+    nodes = [node for node in support_tree.iter_descendants() if not node.is_leaf()]
+    leaf_bits = leaf_bitmasks(names)
+    node_splits = tree_bipartitions(support_tree, leaf_bits, leaf_bits[leaf_key(outgroup)])
+    n_support = np.zeros(len(nodes), dtype = int)
+    with Pool(processes, initializer = _init_support_worker, initargs = (names, pair_i, pair_j, node_splits, leaf_bits[leaf_key(outgroup)])) as pool:
+        for supported in pool.imap_unordered(_replicate_support, distances, chunksize = 16):
+            n_support += supported
+
+    for node, count in zip(nodes, n_support):
+        setattr(node, 'n_support', int(count))
+        setattr(node, 'pct_support', 100*node.n_support/n_bootstrap_samples)
+        support_dic.update({node.get_name():node.pct_support})
+
+    support_s = pd.Series(support_dic)
+    support_s.name = "Percentage bootstrap support"
+    return support_tree, support_s
+
 ### Open csv files from file with the csv filenames
 with open("/media/../filenames.txt", "r") as filenames:
     pwd_files = filenames.read().splitlines() # pwd short for pairwise distance
@@ -89,7 +237,8 @@ nj_newick = skbio.nj(distance_matrix, result_constructor=str)
 nj_tree = treetools.HsTree(nj_newick)
 nj_tree.set_outgroup(outgroup,end_at_present=False) # Setting an outgroup should not really make a difference
 
-support_tree, support_s = get_bootstrap_support(nj_tree, pwd_window, n_bootstrap_samples=1000, outgroup=outgroup)
+#support_tree, support_s = get_bootstrap_support(nj_tree, pwd_window, n_bootstrap_samples=1000, outgroup=outgroup) # original, one DataFrame copy per replicate
+support_tree, support_s = get_bootstrap_support_fast(nj_tree, pwd_window, n_bootstrap_samples=1000, outgroup=outgroup, processes=8, seed=8)
 
 # Print to file
 with open("/media/labgenoma4/DATAPART4/jonasl/sandbox/nj_bootstrap/sum_pairwise_pi_mLynCan_repeatmasked_bs.txt", "w") as f:
@@ -4,35 +4,104 @@
 DESCRIPTION
 Script to calculate the consensus of a series of MSMC2 bootstraps.
 Input files are *.final.txt files for the bootstrap replicates.
+With --summary, the replicates are also put on one shared (log-spaced) time grid and summarized per time point:
+mean, standard deviation, median and quantiles of every lambda column (lambda, or lambda_00, lambda_01, lambda_11).
+The summary is a tab-separated file with column time and columns like lambda_mean, lambda_sd, lambda_median, lambda_q0.025,
+to be drawn as one band with msmc2_plot_bs.py --summary. Times and lambdas are in MSMC2 scaled units, like *.final.txt.
 
 USAGE
 python msmc2_consensus.py
     --input /fullpath/*.final.txt
     --output /fullpath/SAMPLE_consensus.final.txt
+    --summary /fullpath/SAMPLE_bootstrap_summary.tsv [optional]
+    --quantiles 0.025 0.975 [optional, default]
+    --grid 200 [optional, number of time points, default]
 
 Author: Jonas Lescroart
+UPDATES
+18OCT26: replicates read in parallel and averaged as one array; --summary for mean, sd, median and quantile bands on a shared time grid
 """
 
 #import modules
 import argparse
+import numpy as np
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 
-#take command line arguments
-parser = argparse.ArgumentParser()
-parser.add_argument('--input', help="Absolute path to bootstrap iteration *.final.txt files", nargs='+', type= str)
-parser.add_argument('--output', help="Absolute path to *consensus.final.txt file", type= str)
-args = parser.parse_args()
-
-#assert obligatory arguments and create variables
-assert args.input, "usage: msmc2_plot_bs.py [-h] [--input *.final.txt] [--output SAMPLE_consensus.final.txt]"
-infiles = args.input
-
-#average bootstraps
-for file in range(len(infiles)):
-    if file == 0:
-        cons = pd.read_csv(infiles[file], delim_whitespace = True)
-    else:
-        cons += pd.read_csv(infiles[file], delim_whitespace = True)
-
-cons = cons/len(infiles)
-cons.to_csv(args.output, sep = "\t", index = False)
+#define functions
+def read_final(infile):
+    # Returns a *.final.txt file of MSMC2 as DataFrame
+    return pd.read_csv(infile, sep = r"\s+")
+
+def read_replicates(infiles, threads = 8):
+    # Returns the replicates as list of DataFrames, read in parallel
+    with ThreadPoolExecutor(max_workers = threads) as pool:
+        return list(pool.map(read_final, infiles))
+
+def lambda_columns(data):
+    # Returns the names of the coalescence rate columns
+    return [column for column in data.columns if column.startswith("lambda")]
+
+def time_grid(replicates, points = 200):
+    # Returns a log-spaced time grid from the smallest non-zero to the largest left time boundary of all replicates, starting at 0
+    boundaries = np.concatenate([data["left_time_boundary"].values for data in replicates])
+    positive = boundaries[boundaries > 0]
+    return np.concatenate([[0.0], np.geomspace(positive.min(), boundaries.max(), points - 1)])
+
+def grid_values(replicates, grid):
+    # Returns a replicates x time points x lambda columns array with the step function of every replicate evaluated on the grid
+    columns = lambda_columns(replicates[0])
+    values = np.empty((len(replicates), len(grid), len(columns)))
+    for i, data in enumerate(replicates):
+        step = np.searchsorted(data["left_time_boundary"].values, grid, side = "right") - 1
+        values[i] = data[columns].values[np.clip(step, 0, len(data) - 1)]
+    return columns, values
+
+def summarize(replicates, quantiles = (0.025, 0.975), points = 200):
+    # Returns a DataFrame with time and mean, sd, median and quantiles over the replicates of every lambda column
+    grid = time_grid(replicates, points)
+    columns, values = grid_values(replicates, grid)
+    stats = {"time": grid}
+    mean = values.mean(axis = 0)
+    sd = values.std(axis = 0, ddof = 1) if len(replicates) > 1 else np.full(mean.shape, np.nan)
+    bands = np.quantile(values, [0.5] + list(quantiles), axis = 0)
+    for c, column in enumerate(columns):
+        stats[column + "_mean"] = mean[:, c]
+        stats[column + "_sd"] = sd[:, c]
+        stats[column + "_median"] = bands[0, :, c]
+        for q, quantile in enumerate(quantiles):
+            stats[column + "_q" + str(quantile)] = bands[q + 1, :, c]
+    return pd.DataFrame(stats)
+
+def consensus(replicates):
+    # Returns the mean of every column over the replicates (the consensus of earlier versions)
+    total = replicates[0].values.astype(np.float64)
+    for data in replicates[1:]:
+        total += data.values
+    return pd.DataFrame(total / len(replicates), columns = replicates[0].columns)
+
+if __name__ == "__main__":
+    #take command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', help="Absolute path to bootstrap iteration *.final.txt files", nargs='+', type= str)
+    parser.add_argument('--output', help="Absolute path to *consensus.final.txt file", type= str)
+    parser.add_argument('--summary', help="Absolute path to output file with mean, sd, median and quantiles on a shared time grid", type= str)
+    parser.add_argument('--quantiles', help="Quantiles for the summary, default 0.025 0.975", nargs='+', default=[0.025, 0.975], type=float)
+    parser.add_argument('--grid', help="Number of time points for the summary, default 200", default=200, type=int)
+    parser.add_argument('--threads', help="Number of files read in parallel, default 8", default=8, type=int)
+    args = parser.parse_args()
+
+    #assert obligatory arguments and create variables
+    assert args.input, "usage: msmc2_consensus.py [-h] [--input *.final.txt] [--output SAMPLE_consensus.final.txt] [--summary SAMPLE_bootstrap_summary.tsv]"
+    assert args.output or args.summary, "Provide --output and/or --summary"
+    replicates = read_replicates(args.input, args.threads)
+
+    #average bootstraps
+    if args.output:
+        shapes = set(data.shape for data in replicates)
+        assert len(shapes) == 1, "Bootstrap files have different numbers of time segments or columns"
+        consensus(replicates).to_csv(args.output, sep = "\t", index = False)
+
+    #summarize bootstraps on a shared time grid
+    if args.summary:
+        summarize(replicates, args.quantiles, args.grid).to_csv(args.summary, sep = "\t", index = False)
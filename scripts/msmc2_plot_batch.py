@@ -0,0 +1,113 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Script to draw all MSMC2 figures of a manifest in one run: Ne curves with bootstraps (msmc2_plot_bs.py)
+and relative cross-coalescence plots of pairs (msmc2_plot_rCCR.py).
+Figures are drawn in a pool of worker processes with the non-interactive Agg backend, and every worker
+reuses one figure per plot type instead of making a new one for each sample.
+Optionally all figures are also written to one multi-page pdf, in manifest order.
+
+The manifest is a tab-separated file with a header line and the columns:
+type        bs (Ne with bootstraps) or rccr (pair)
+input       *.final.txt file (consensus of a sample, or combined file of a pair)
+output      pdf (or png, svg) of the figure, can be empty with --combined
+bootstrap   bs only, optional: bootstrap *.final.txt files separated by commas, or a glob pattern
+summary     bs only, optional: bootstrap summary of msmc2_consensus.py --summary
+label       optional: title (bs), or the two legend labels separated by a comma (rccr)
+Missing columns are treated as empty. Mutation rate and generation time are the same for all figures.
+
+USAGE
+python msmc2_plot_batch.py --manifest figures.tsv [--combined all.pdf] [--mu 0.86e-8] [--gen 3.8] [--processes 4]
+
+Author: Jonas Lescroart
+Created 18OCT26
+"""
+
+#import modules
+import argparse
+import csv
+import glob
+import sys
+import matplotlib
+matplotlib.use("Agg")
+import matplotlib.pyplot as plt
+from multiprocessing import Pool
+from msmc2_plot_bs import plot_bs
+from msmc2_plot_rCCR import plot_rccr
+
+#define functions
+COLUMNS = ["type", "input", "output", "bootstrap", "summary", "label"]
+
+def read_manifest(infile):
+    # Returns the figures of a manifest as list of dictionaries with all COLUMNS
+    with open(infile, newline = "") as manifest:
+        rows = [row for row in csv.DictReader(manifest, delimiter = "\t") if row.get("type")]
+    figures = []
+    for row in rows:
+        figure = {column: (row.get(column) or "").strip() for column in COLUMNS}
+        assert figure["type"] in ("bs", "rccr"), "Unknown figure type {} in {}".format(figure["type"], infile)
+        assert figure["input"], "No input file in a line of {}".format(infile)
+        figures.append(figure)
+    return figures
+
+def bootstrap_files(value):
+    # Returns the bootstrap files of a manifest entry: comma-separated list or glob pattern
+    if not value:
+        return None
+    if "," in value:
+        return [file for file in value.split(",") if file]
+    return sorted(glob.glob(value)) or [value]
+
+_templates = {} # one figure per plot type, reused within a worker process
+
+def render(args):
+    # Draws one figure, saves it if it has an output file, and returns the figure (for the combined pdf) or None
+    figure, mu, gen, keep = args
+    fig = _templates.get(figure["type"])
+    if figure["type"] == "bs":
+        fig = plot_bs(figure["input"], bootstrap_files(figure["bootstrap"]), figure["summary"] or None, mu, gen, fig, figure["label"] or None)
+    else:
+        labels = figure["label"].split(",") if figure["label"] else ["Andean tiger cat", "Costa Rica tiger cat"]
+        fig, split = plot_rccr(figure["input"], mu, gen, labels, fig)
+    _templates[figure["type"]] = fig
+    if figure["output"]:
+        fig.savefig(figure["output"])
+    return fig if keep else None
+
+if __name__ == "__main__":
+    #take command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--manifest', help="Tab-separated file with the figures to draw, see script description", required=True, type=str)
+    parser.add_argument('--combined', help="Multi-page pdf with all figures, in manifest order", type=str)
+    parser.add_argument('--mu', help="Mutation rate, default 0.86e-8", default=0.86e-8, type=float)
+    parser.add_argument('--gen', help="Generation time, default 3.8. Use 1 to express time in generations", default=3.8, type=float)
+    parser.add_argument('--processes', help="Number of worker processes, default 4", default=4, type=int)
+    args = parser.parse_args()
+
+    figures = read_manifest(args.manifest)
+    for figure in figures:
+        assert figure["output"] or args.combined, "No output for {}, give an output file or use --combined".format(figure["input"])
+    tasks = [(figure, args.mu, args.gen, bool(args.combined)) for figure in figures]
+
+    #draw in parallel; figures come back in manifest order for the combined pdf
+    pages = None
+    if args.combined:
+        from matplotlib.backends.backend_pdf import PdfPages
+        pages = PdfPages(args.combined)
+    if args.processes > 1 and len(tasks) > 1:
+        pool = Pool(min(args.processes, len(tasks)))
+        results = pool.imap(render, tasks)
+    else:
+        pool = None
+        results = map(render, tasks)
+    for fig in results:
+        if pages is not None:
+            pages.savefig(fig)
+            plt.close(fig)
+    if pool:
+        pool.close()
+        pool.join()
+    if pages is not None:
+        pages.close()
+    print("Drew {} figures".format(len(tasks)), file = sys.stderr)
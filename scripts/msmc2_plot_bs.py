@@ -15,10 +15,17 @@ python msmc2_plot_bs.py
     --input /fullpath/SAMPLE.final.txt
     --output /fullpath/SAMPLE.pdf
     --bootstrap /fullpath/*.final.txt
+    or --summary /fullpath/SAMPLE_bootstrap_summary.tsv (from msmc2_consensus.py --summary, drawn as one band)
     --mu [mutation rate, default 0.86e-8]
     --gen [generation time, default 1]
 
+from msmc2_plot_bs import plot_bs (see msmc2_plot_batch.py to plot many samples at once)
+
 Author: Jonas Lescroart
+UPDATES
+18OCT26: --summary draws the bootstrap quantile band and median from msmc2_consensus.py as one filled area, instead of one line per replicate
+18OCT26: plotting in function plot_bs, which can draw on an existing figure
+18OCT26: all step lines drawn with where = "post" (population size holds from each left time boundary), like the bootstrap band
 """
 
 #import modules
@@ -27,66 +34,88 @@ import argparse
 import pandas as pd
 import matplotlib.pyplot as plt
 
-#take command line arguments
-parser = argparse.ArgumentParser()
-parser.add_argument('--input', help="Absolute path to *.final.txt file", type= str)
-parser.add_argument('--output', help="Absolute path to *.pdf file", type= str)
-parser.add_argument('--bootstrap', help="Absolute path to bootstrap iteration *.final.txt files", nargs='+', type= str)
-parser.add_argument('--mu', help="Mutation rate", default=0.86e-8, type=float)
-parser.add_argument('--gen', help="Generation time. Use default (1) to display time in generations instead of years", default=1, type=float)
-args = parser.parse_args()
-
-#assert obligatory arguments and create variables
-assert args.input, "usage: msmc2_plot_bs.py [-h] [--input SAMPLE.final.txt] optional: [--output] [--bootstrap] [--mu] [--gen]"
-in_file = args.input
-sample_id = in_file.split('/')[-1][:-10]
-
-#initiate figure
-plt.figure(figsize = [10, 5])
-
-#add bootstrap lines if present
-if args.bootstrap:
-    bs_files = args.bootstrap
-    for file in range(len(bs_files)):
-        if file == 0: #label for first entry to add to legend once
-            data = pd.read_csv(bs_files[file], delim_whitespace = True)
-            plt.step(data["left_time_boundary"]/args.mu*args.gen,
-            (1/data["lambda"])/(2*args.mu),
+#define functions
+def sample_name(in_file):
+    # Returns the sample id of a *.final.txt file
+    return in_file.split('/')[-1][:-10]
+
+def plot_bs(in_file, bootstrap = None, summary = None, mu = 0.86e-8, gen = 1, fig = None, label = None):
+    # Draws the MSMC2 curve of in_file with bootstrap lines or a bootstrap summary band. Returns the figure.
+    # An existing figure is cleared and reused, otherwise a new one is made.
+    sample_id = label if label else sample_name(in_file)
+    if fig is None:
+        fig = plt.figure(figsize = [10, 5])
+    else:
+        fig.clf()
+    ax = fig.add_subplot(111)
+
+    #add bootstrap lines if present
+    if bootstrap:
+        for file in range(len(bootstrap)):
+            data = pd.read_csv(bootstrap[file], sep = r"\s+")
+            ax.step(data["left_time_boundary"]/mu*gen,
+            (1/data["lambda"])/(2*mu), where = "post",
             color = "lightblue", linestyle='dashed', linewidth = 0.5,
-            label = "Bootstrap x" + str(len(bs_files)))
-        else:
-            data = pd.read_csv(bs_files[file], delim_whitespace = True)
-            plt.step(data["left_time_boundary"]/args.mu*args.gen,
-            (1/data["lambda"])/(2*args.mu),
-            color = "lightblue", linestyle='dashed', linewidth = 0.5)
-
-#add main line element
-data = pd.read_csv(in_file, delim_whitespace = True)
-plt.step(data["left_time_boundary"]/args.mu*args.gen,
-(1/data["lambda"])/(2*args.mu),
-color = "blue",
-label = sample_id)
-
-#plot other elements
-if args.gen == 1:
-    plt.xlabel("Generations (μ = " + str(args.mu) + " mutations/bp/gen)")
-    plt.xlim(left = 1e3, right = 1e6)
-else:
-    plt.xlabel("Years before present (μ = " + str(args.mu) + " mutations/bp/gen; generation time = " + str(args.gen)  + "y)")
-    plt.xlim(left = 1e3)
-plt.ylim(0,50e4)
-plt.ylabel("Effective population size (Ne)")
-plt.gca().set_xscale("log")
-plt.legend()
-plt.title(sample_id)
-
-#save plot and close
-if args.output:
-    plt.savefig(args.output, format = "pdf")
-else:
+            label = "Bootstrap x" + str(len(bootstrap)) if file == 0 else None) #label for first entry to add to legend once
+
+    #add bootstrap band if present, between the lowest and highest quantile in the summary
+    if summary:
+        data = pd.read_csv(summary, sep = "\t")
+        quantiles = sorted(column for column in data.columns if column.startswith("lambda_q"))
+        time = data["time"]/mu*gen
+        ax.fill_between(time,
+        (1/data[quantiles[-1]])/(2*mu),
+        (1/data[quantiles[0]])/(2*mu),
+        step = "post", color = "lightblue", linewidth = 0,
+        label = "Bootstrap " + quantiles[0][len("lambda_q"):] + "-" + quantiles[-1][len("lambda_q"):])
+        ax.step(time, (1/data["lambda_median"])/(2*mu), where = "post",
+        color = "lightblue", linestyle='dashed', linewidth = 0.5,
+        label = "Bootstrap median")
+
+    #add main line element
+    data = pd.read_csv(in_file, sep = r"\s+")
+    ax.step(data["left_time_boundary"]/mu*gen,
+    (1/data["lambda"])/(2*mu), where = "post",
+    color = "blue",
+    label = sample_id)
+
+    #plot other elements
+    if gen == 1:
+        ax.set_xlabel("Generations (μ = " + str(mu) + " mutations/bp/gen)")
+        ax.set_xlim(left = 1e3, right = 1e6)
+    else:
+        ax.set_xlabel("Years before present (μ = " + str(mu) + " mutations/bp/gen; generation time = " + str(gen)  + "y)")
+        ax.set_xlim(left = 1e3)
+    ax.set_ylim(0,50e4)
+    ax.set_ylabel("Effective population size (Ne)")
+    ax.set_xscale("log")
+    ax.legend()
+    ax.set_title(sample_id)
+    return fig
+
+def default_output(in_file):
+    # Returns SAMPLE.pdf next to the input file
     if in_file.startswith("/"):
         path = str(('/').join(in_file.split('/')[:-1])) + '/'
     else:
         path = os.getcwd() + '/'
-    plt.savefig(path + sample_id + ".pdf", format = "pdf")
-plt.close()
+    return path + sample_name(in_file) + ".pdf"
+
+if __name__ == "__main__":
+    #take command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--input', help="Absolute path to *.final.txt file", type= str)
+    parser.add_argument('--output', help="Absolute path to *.pdf file", type= str)
+    parser.add_argument('--bootstrap', help="Absolute path to bootstrap iteration *.final.txt files", nargs='+', type= str)
+    parser.add_argument('--summary', help="Absolute path to bootstrap summary of msmc2_consensus.py --summary, alternative to --bootstrap", type= str)
+    parser.add_argument('--mu', help="Mutation rate", default=0.86e-8, type=float)
+    parser.add_argument('--gen', help="Generation time. Use default (1) to display time in generations instead of years", default=1, type=float)
+    args = parser.parse_args()
+
+    #assert obligatory arguments and create variables
+    assert args.input, "usage: msmc2_plot_bs.py [-h] [--input SAMPLE.final.txt] optional: [--output] [--bootstrap] [--summary] [--mu] [--gen]"
+
+    #plot, save and close
+    fig = plot_bs(args.input, args.bootstrap, args.summary, args.mu, args.gen)
+    fig.savefig(args.output if args.output else default_output(args.input), format = "pdf")
+    plt.close(fig)
@@ -7,65 +7,150 @@ Input fileis something like combined_pardinoides_oncilla_consensus.final.txt
 
 USAGE
 python msmc2_plot.py combined_pardinoides_oncilla_consensus.final.txt
+Optional: --output rCCR.pdf --mu 0.86e-8 --gen 3.8 --labels "Andean tiger cat" "Costa Rica tiger cat"
+python msmc2_plot_rCCR.py --pairs pairs.tsv --split-table split_times.tsv [--fraction 0.5] [--absolute]
+    pairs.tsv has columns pair, consensus (combined *.final.txt, can be empty) and bootstrap (glob pattern of the
+    combined *.final.txt files of the bootstrap replicates). The table holds the split time of the consensus and the
+    mean, sd, median and 95% interval of the bootstrap split times, per pair.
+
+from msmc2_plot_rCCR import plot_rccr (see msmc2_plot_batch.py to plot many pairs at once)
 
 Author: Jonas Lescroart
+UPDATES
+18OCT26: plotting in function plot_rccr, mutation rate, generation time, output and labels as options (defaults as before)
+18OCT26: split times of many replicates at once (ccr_split_times), split time table with bootstrap intervals (--pairs, --split-table)
 """
 
 #import modules
+import argparse
 import sys
-import os
 import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
+from msmc2_consensus import read_replicates
 
 #define functions
-def getCCRintersect(df, val):
-    xVec = generation_time * ((df.left_time_boundary + df.right_time_boundary)/2) / mutation_rate
-    yVec = 2.0 * df.lambda_01 / (df.lambda_00 + df.lambda_11)
-    i = 0
-    while yVec[i] < val:
-        i += 1
-    assert i > 0 and i <= len(yVec), "CCR intersection index out of bounds: {}".format(i)
-    assert yVec[i - 1] < val and yVec[i] >= val, "this should never happen"
-    intersectDistance = (val - yVec[i - 1]) / (yVec[i] - yVec[i - 1])
-    return xVec[i - 1] + intersectDistance * (xVec[i] - xVec[i - 1])
-
-#take arguments and variables
-files = sys.argv[1:]
-mutation_rate = 0.86e-8
-generation_time = 3.8 #use 1 to express time in generations, use biological generation time to express time in years
-
-#Manual plotting of the relative cross-coalescent rate.
-# Code based on https://github.com/StatisticalPopulationGenomics/MSMCandMSMC2/blob/master/plot_msmc.py
-msmc_out=pd.read_csv(files[0], sep='\t', header=0)
-t_years=generation_time * ((msmc_out.left_time_boundary + msmc_out.right_time_boundary)/2) / mutation_rate
-
-plt.figure(figsize = [10, 8])
-plt.subplot(211)
-plt.semilogx(t_years, (1/msmc_out.lambda_00)/(2*mutation_rate), drawstyle='steps', color='purple', label='Andean tiger cat')
-plt.semilogx(t_years, (1/msmc_out.lambda_11)/(2*mutation_rate), drawstyle='steps', color='red', label='Costa Rica tiger cat')
-plt.xlabel("Years before present (μ = " + str(mutation_rate) + " mutations/bp/gen; generation time = " + str(generation_time)  + "y)")
-plt.xlim(left = 3e3, right = 5e6)
-plt.ylabel("Effective population size (Ne)")
-plt.ylim(0,10e4)
-plt.legend()
-
-plt.subplot(212)
-relativeCCR=2.0 * msmc_out.lambda_01 / (msmc_out.lambda_00 + msmc_out.lambda_11)
-relativeCCR = relativeCCR * plt.ylim()[1] #scale rCCR (0-1) with popsize
-plt.semilogx(t_years,relativeCCR, drawstyle='steps', color = "grey", label = "Relative cross-coalescent rate")
-plt.xlim(left = 3e3, right = 5e6)
-plt.ylim(0,1)
-plt.ylabel("Relative cross-coalescent rate (rCCR)")
-
-#split = getCCRintersect(msmc_out, 0.5)
-split = getCCRintersect(msmc_out, (max(relativeCCR)/2)/plt.ylim()[1])
-
-plt.vlines(split, plt.ylim()[0], plt.ylim()[1], color = "black", linestyle='dashed', linewidth = 0.5, label = "50% rCCR")
-plt.annotate(" {:.1e}".format(split), (split, 1e4))
-plt.xlabel("Estimated split time is " + str(round(split/1000)) + " kya")
-
-plt.legend()
-plt.savefig("rCCR_pardinoides_oncilla_consensus.pdf")
-
-print(split) #Print out the time when relativeCCR=0.5
+def ccr_split_times(replicates, val = 0.5, relative = False, mutation_rate = 0.86e-8, generation_time = 3.8):
+    # Returns the time at which the rCCR first reaches val, for every replicate (DataFrames of combined *.final.txt files).
+    # With relative, val is a fraction of the maximum rCCR of each replicate (as in the plot). Time is taken at the middle of
+    # the segments and interpolated linearly, in years (or generations with generation_time 1). NaN if the rCCR never
+    # reaches val, or already does in the first segment.
+    # Replicates are padded to the same number of segments and done as one replicates x segments array.
+    n = max(len(df) for df in replicates)
+    xVec = np.full((len(replicates), n), np.nan)
+    yVec = np.full((len(replicates), n), np.nan)
+    for r, df in enumerate(replicates):
+        xVec[r, :len(df)] = generation_time * ((df.left_time_boundary.values + df.right_time_boundary.values)/2) / mutation_rate
+        yVec[r, :len(df)] = 2.0 * df.lambda_01.values / (df.lambda_00.values + df.lambda_11.values)
+    vals = val * np.nanmax(yVec, axis = 1) if relative else np.full(len(replicates), float(val))
+    reached = yVec >= vals[:, None]
+    i = reached.argmax(axis = 1)
+    valid = reached.any(axis = 1) & (i > 0)
+    i = np.where(valid, i, 1)
+    rows = np.arange(len(replicates))
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        intersectDistance = (vals - yVec[rows, i - 1]) / (yVec[rows, i] - yVec[rows, i - 1])
+        split = xVec[rows, i - 1] + intersectDistance * (xVec[rows, i] - xVec[rows, i - 1])
+    return np.where(valid, split, np.nan)
+
+def getCCRintersect(df, val, mutation_rate = 0.86e-8, generation_time = 3.8):
+    # Returns the time at which the rCCR of one combined file first reaches val (see ccr_split_times)
+    split = ccr_split_times([df], val, False, mutation_rate, generation_time)[0]
+    assert not np.isnan(split), "rCCR doesn't cross {} after the first time segment".format(val)
+    return split
+
+def split_time_table(pairs, val = 0.5, relative = True, mutation_rate = 0.86e-8, generation_time = 3.8, quantiles = (0.025, 0.975), threads = 8):
+    # Returns a DataFrame with the split time distribution over bootstrap replicates of every pair.
+    # pairs maps a pair name to (consensus file or None, list of bootstrap files).
+    rows = []
+    for pair, (consensus, bootstrap) in pairs.items():
+        splits = ccr_split_times(read_replicates(bootstrap, threads), val, relative, mutation_rate, generation_time) if bootstrap else np.array([np.nan])
+        found = splits[~np.isnan(splits)]
+        row = {"pair": pair,
+            "split_time": ccr_split_times(read_replicates([consensus]), val, relative, mutation_rate, generation_time)[0] if consensus else np.nan,
+            "replicates": len(bootstrap), "replicates_crossing": len(found),
+            "mean": found.mean() if len(found) else np.nan,
+            "sd": found.std(ddof = 1) if len(found) > 1 else np.nan,
+            "median": np.median(found) if len(found) else np.nan}
+        for quantile in quantiles:
+            row["q" + str(quantile)] = np.quantile(found, quantile) if len(found) else np.nan
+        rows.append(row)
+    return pd.DataFrame(rows)
+
+def read_pairs(infile):
+    # Returns the pairs of a tab-separated file with columns pair, consensus (can be empty) and bootstrap (glob pattern)
+    import glob
+    pairs = {}
+    table = pd.read_csv(infile, sep = "\t", dtype = str, keep_default_na = False)
+    for pair, consensus, bootstrap in zip(table["pair"], table["consensus"], table["bootstrap"]):
+        pairs[pair] = (consensus or None, sorted(glob.glob(bootstrap)) if bootstrap else [])
+    return pairs
+
+def plot_rccr(infile, mutation_rate = 0.86e-8, generation_time = 3.8, labels = ("Andean tiger cat", "Costa Rica tiger cat"), fig = None):
+    # Draws Ne of both populations and the rCCR of a combined MSMC2 file. Returns the figure and the estimated split time.
+    # An existing figure is cleared and reused, otherwise a new one is made.
+    # Use generation_time 1 to express time in generations, the biological generation time to express time in years.
+    if fig is None:
+        fig = plt.figure(figsize = [10, 8])
+    else:
+        fig.clf()
+
+    #Manual plotting of the relative cross-coalescent rate.
+    # Code based on https://github.com/StatisticalPopulationGenomics/MSMCandMSMC2/blob/master/plot_msmc.py
+    msmc_out=pd.read_csv(infile, sep='\t', header=0)
+    t_years=generation_time * ((msmc_out.left_time_boundary + msmc_out.right_time_boundary)/2) / mutation_rate
+
+    ax = fig.add_subplot(211)
+    ax.semilogx(t_years, (1/msmc_out.lambda_00)/(2*mutation_rate), drawstyle='steps', color='purple', label=labels[0])
+    ax.semilogx(t_years, (1/msmc_out.lambda_11)/(2*mutation_rate), drawstyle='steps', color='red', label=labels[1])
+    ax.set_xlabel("Years before present (μ = " + str(mutation_rate) + " mutations/bp/gen; generation time = " + str(generation_time)  + "y)")
+    ax.set_xlim(left = 3e3, right = 5e6)
+    ax.set_ylabel("Effective population size (Ne)")
+    ax.set_ylim(0,10e4)
+    ax.legend()
+
+    ax = fig.add_subplot(212)
+    relativeCCR=2.0 * msmc_out.lambda_01 / (msmc_out.lambda_00 + msmc_out.lambda_11)
+    relativeCCR = relativeCCR * ax.get_ylim()[1] #scale rCCR (0-1) with popsize
+    ax.semilogx(t_years,relativeCCR, drawstyle='steps', color = "grey", label = "Relative cross-coalescent rate")
+    ax.set_xlim(left = 3e3, right = 5e6)
+    ax.set_ylim(0,1)
+    ax.set_ylabel("Relative cross-coalescent rate (rCCR)")
+
+    #split = getCCRintersect(msmc_out, 0.5, mutation_rate, generation_time)
+    split = getCCRintersect(msmc_out, (max(relativeCCR)/2)/ax.get_ylim()[1], mutation_rate, generation_time)
+
+    ax.vlines(split, ax.get_ylim()[0], ax.get_ylim()[1], color = "black", linestyle='dashed', linewidth = 0.5, label = "50% rCCR")
+    ax.annotate(" {:.1e}".format(split), (split, 1e4))
+    ax.set_xlabel("Estimated split time is " + str(round(split/1000)) + " kya")
+
+    ax.legend()
+    return fig, split
+
+if __name__ == "__main__":
+    #take arguments and variables
+    parser = argparse.ArgumentParser()
+    parser.add_argument('files', nargs='*', help="combined *.final.txt file of a pair of samples")
+    parser.add_argument('--output', help="Output pdf, default rCCR_pardinoides_oncilla_consensus.pdf", default="rCCR_pardinoides_oncilla_consensus.pdf", type=str)
+    parser.add_argument('--mu', help="Mutation rate, default 0.86e-8", default=0.86e-8, type=float)
+    parser.add_argument('--gen', help="Generation time, default 3.8. Use 1 to express time in generations", default=3.8, type=float)
+    parser.add_argument('--labels', help="Legend labels of the two populations", nargs=2, default=["Andean tiger cat", "Costa Rica tiger cat"], type=str)
+    parser.add_argument('--pairs', help="Tab-separated file with columns pair, consensus and bootstrap (glob pattern), for --split-table", type=str)
+    parser.add_argument('--split-table', help="Write a table with split times and bootstrap intervals of the pairs in --pairs, instead of plotting", type=str)
+    parser.add_argument('--fraction', help="rCCR value that defines the split, default 0.5", default=0.5, type=float)
+    parser.add_argument('--absolute', help="Use --fraction as rCCR value, instead of as fraction of the maximum rCCR (as in the plot)", action='store_true')
+    parser.add_argument('--threads', help="Number of files read in parallel, default 8", default=8, type=int)
+    args = parser.parse_args()
+
+    if args.split_table:
+        assert args.pairs, "Provide the pairs with --pairs"
+        table = split_time_table(read_pairs(args.pairs), args.fraction, not args.absolute, args.mu, args.gen, threads = args.threads)
+        table.to_csv(args.split_table, sep = "\t", index = False)
+        sys.exit()
+    assert args.files, "Provide a combined *.final.txt file"
+
+    fig, split = plot_rccr(args.files[0], args.mu, args.gen, args.labels)
+    fig.savefig(args.output)
+    plt.close(fig)
+
+    print(split) #Print out the time when relativeCCR=0.5
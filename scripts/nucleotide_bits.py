@@ -0,0 +1,169 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Compact 4-bit representation of nucleotide alignments, with pairwise distance kernels that understand IUPAC ambiguity codes.
+Every site is stored as the set of bases it can be, one bit each (A = 1, C = 2, G = 4, T = 8), so R (A/G) = 5 and V (A/C/G) = 7.
+N, gaps and other symbols are stored as the empty set (0): missing data. Two sites are packed in one byte (first site in the
+high 4 bits), so an alignment takes half the memory of one byte per base, and a quarter or less of Python strings.
+Per pair of sequences, over whole arrays at once:
+valid sites     sites where neither sequence is missing: popcount of (flags a AND flags b)
+mismatches      valid sites where the two sets don't share a base: valid sites - popcount of the flags of (a AND b)
+expected        expected number of differences between a random base of each set, sum of 1 - |a AND b| / (|a| |b|) over valid
+differences     sites; same as mismatches for unambiguous bases, a heterozygous R against A counts as 0.5 (a byte pair table)
+Decoding gives back the upper case symbol of every set (N for missing data, so gaps come back as N).
+
+USAGE
+from nucleotide_bits import encode, decode, pairwise_bits
+packed, length = encode(["ACGTR", "ACGTA"])
+ids, packed, length = read_packed("window.fasta")           # read and packed one sequence at a time
+mismatches, valid_sites, expected = pairwise_bits(packed)
+decode(packed, length)                                       # [b"ACGTR", b"ACGTA"]
+
+python3 nucleotide_bits.py infile.fasta                      # prints the mismatches, valid sites and expected differences per pair
+
+Created 18OCT26
+"""
+
+# Import modules
+import sys
+import numpy as np
+
+# Define functions
+BASE_BITS = {"A": 1, "C": 2, "G": 4, "T": 8}
+IUPAC_SETS = {"R": "AG", "Y": "CT", "S": "CG", "W": "AT", "K": "GT", "M": "AC", "B": "CGT", "D": "AGT", "H": "ACT", "V": "ACG"}
+
+def code_table():
+    # Returns a 256-entry table with the 4-bit base set of every byte (both cases), 0 for missing data and other symbols
+    table = np.zeros(256, dtype = np.uint8)
+    sets = dict(BASE_BITS)
+    sets.update({code: sum(BASE_BITS[base] for base in bases) for code, bases in IUPAC_SETS.items()})
+    sets["U"] = BASE_BITS["T"]
+    for symbol, bits in sets.items():
+        table[ord(symbol)] = table[ord(symbol.lower())] = bits
+    return table
+
+def symbol_table():
+    # Returns the upper case symbol of every 4-bit base set (N for the empty and the full set)
+    symbols = np.full(16, ord("N"), dtype = np.uint8)
+    for base, bits in BASE_BITS.items():
+        symbols[bits] = ord(base)
+    for code, bases in IUPAC_SETS.items():
+        symbols[sum(BASE_BITS[base] for base in bases)] = ord(code)
+    return symbols
+
+CODES = code_table()
+SYMBOLS = symbol_table()
+POPCOUNT = np.array([bin(byte).count("1") for byte in range(256)], dtype = np.uint8)
+# Per byte, one flag bit for each of its two sites that is not missing (0x10 for the high site, 0x01 for the low site)
+FLAGS = np.array([(0x10 if byte >> 4 else 0) | (0x01 if byte & 15 else 0) for byte in range(256)], dtype = np.uint8)
+
+def similarity_table():
+    # Returns a 65536-entry table (index: byte a * 256 + byte b) with, summed over the two sites of the bytes,
+    # the probability that a random base of each set is the same: |a AND b| / (|a| |b|), 0 for missing sites
+    nibble = np.zeros((16, 16))
+    for a in range(1, 16):
+        for b in range(1, 16):
+            nibble[a, b] = POPCOUNT[a & b] / float(POPCOUNT[a] * POPCOUNT[b])
+    high, low = np.arange(256) >> 4, np.arange(256) & 15
+    return (nibble[high[:, None], high[None, :]] + nibble[low[:, None], low[None, :]]).ravel()
+
+SIMILARITY = similarity_table()
+
+def encode_symbols(sequences):
+    # Returns a taxa x sites matrix of ASCII codes (uint8), from a uint8 matrix or a list of str, bytes or SeqRecords of equal length
+    if isinstance(sequences, np.ndarray):
+        return sequences
+    sequences = [seq if isinstance(seq, bytes) else str(getattr(seq, "seq", seq)).encode("ascii") for seq in sequences]
+    lengths = set(len(seq) for seq in sequences)
+    assert len(lengths) <= 1, "Sequences in the alignment differ in length: {}".format(sorted(lengths))
+    length = lengths.pop() if lengths else 0
+    return np.frombuffer(b"".join(sequences), dtype = np.uint8).reshape(len(sequences), length)
+
+def pack(codes):
+    # Returns a taxa x ceil(sites / 2) uint8 matrix with two 4-bit codes per byte; an odd last site is padded with missing data
+    codes = np.atleast_2d(codes)
+    if codes.shape[1] % 2:
+        codes = np.concatenate([codes, np.zeros((len(codes), 1), dtype = np.uint8)], axis = 1)
+    return (codes[:, 0::2] << 4) | codes[:, 1::2]
+
+def unpack(packed, length):
+    # Returns the taxa x length matrix of 4-bit codes of a packed matrix
+    codes = np.empty((len(packed), packed.shape[1] * 2), dtype = np.uint8)
+    codes[:, 0::2] = packed >> 4
+    codes[:, 1::2] = packed & 15
+    return codes[:, :length]
+
+def encode(sequences):
+    # Returns the packed 4-bit matrix and the number of sites of an alignment (see encode_symbols for the input)
+    symbols = encode_symbols(sequences)
+    return pack(CODES[symbols]), symbols.shape[1]
+
+def pack_sequence(sequence):
+    # Returns one sequence (bytes) as a row of packed 4-bit codes
+    return pack(CODES[np.frombuffer(sequence, dtype = np.uint8)])[0]
+
+def read_packed(infile):
+    # Returns the sequence ids (sorted), the packed matrix and the number of sites of a fasta alignment.
+    # Every sequence is packed as soon as it is read, so at most one sequence is held unpacked.
+    from fasta_windows import iter_fasta_blocks
+    rows = {}
+    lengths = {}
+    def add(record_id, blocks):
+        assert record_id not in rows, "Sequence id {} occurs more than once in {}".format(record_id, infile)
+        sequence = b"".join(blocks)
+        rows[record_id] = pack_sequence(sequence)
+        lengths[record_id] = len(sequence)
+    record_id = None
+    blocks = []
+    for block_id, block in iter_fasta_blocks(infile):
+        if not block: # start of a record
+            if record_id is not None:
+                add(record_id, blocks)
+            record_id, blocks = block_id, []
+        else:
+            blocks.append(block)
+    if record_id is not None:
+        add(record_id, blocks)
+    assert len(set(lengths.values())) <= 1, "Sequences in the alignment differ in length: {}".format(sorted(set(lengths.values())))
+    ids = sorted(rows)
+    length = lengths[ids[0]] if ids else 0
+    packed = np.stack([rows.pop(id) for id in ids]) if ids else np.zeros((0, 0), dtype = np.uint8)
+    return ids, packed, length
+
+def decode(packed, length):
+    # Returns the sequences of a packed matrix as upper case bytes, N for missing data
+    return [row.tobytes() for row in SYMBOLS[unpack(packed, length)]]
+
+def pairwise_bits(packed, rows = None):
+    # Returns three taxa x taxa matrices for a packed alignment: mismatches and valid sites (int64) and expected differences (float64).
+    # With rows (indices of taxa), returns rows x taxa matrices: only the pairs of those taxa with all taxa, as pairwise_counts in pairwise_pi.py.
+    # Expected differences of a sequence with itself are not 0 at ambiguity codes (R against R is 0.5): its heterozygous sites.
+    rows = np.arange(len(packed)) if rows is None else np.asarray(rows)
+    flags = FLAGS[packed]
+    mismatches = np.zeros((len(rows), len(packed)), dtype = np.int64)
+    valid_sites = np.zeros((len(rows), len(packed)), dtype = np.int64)
+    expected = np.zeros((len(rows), len(packed)), dtype = np.float64)
+    index = packed.astype(np.uint16)
+    for r, i in enumerate(rows):
+        valid_sites[r] = POPCOUNT[flags[i] & flags].sum(axis = 1, dtype = np.int64)
+        mismatches[r] = valid_sites[r] - POPCOUNT[FLAGS[packed[i] & packed]].sum(axis = 1, dtype = np.int64)
+        expected[r] = valid_sites[r] - SIMILARITY[(index[i] << 8) | index].sum(axis = 1)
+    return mismatches, valid_sites, expected
+
+if __name__ == "__main__":
+    import pandas as pd
+
+    # Take input
+    if len(sys.argv) == 2 and sys.argv[1].endswith(tuple([".fasta", "fa", "fas", "fna"])):
+        infile = sys.argv[1]
+    else:
+        raise Exception("Invalid input arguments")
+
+    # Pairwise counts of all sequences, sorted by sequence id
+    ids, packed, length = read_packed(infile)
+    mismatches, valid_sites, expected = pairwise_bits(packed)
+    pair_i, pair_j = np.triu_indices(len(ids), k = 1)
+    table = pd.DataFrame({"id1": [ids[i] for i in pair_i], "id2": [ids[j] for j in pair_j],
+        "mismatches": mismatches[pair_i, pair_j], "valid_sites": valid_sites[pair_i, pair_j], "expected_differences": expected[pair_i, pair_j]})
+    print(table.to_csv(index = False, sep = "\t"), end = "")
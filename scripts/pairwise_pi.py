@@ -8,22 +8,31 @@ Output is a matrix of pi values in csv format, printed to screen.
 
 USAGE
 python3 pairwise_pi.py infile.fasta > outfile.csv
+python3 pairwise_pi.py --iupac infile.fasta > outfile.csv
+    IUPAC ambiguity codes (e.g. -doFasta 4 consensus genomes) count as the expected difference between a random base
+    of each code, so R against A is half a difference and R against G is none (see nucleotide_bits.py)
 
 Version: 13 January 2021
 Author: Jonas Lescroart
+
+UPDATES
+18OCT26: all pairs are computed at once with numpy (functions encode_alignment and pairwise_counts)
+instead of comparing two sequences character by character. Gaps (-) are now treated as missing data, like N.
+18OCT26: pairwise_counts can count only the pairs of some taxa with all others (rows), for incremental updates.
+18OCT26: --iupac, distances that understand IUPAC ambiguity codes, computed on 4-bit packed sequences (nucleotide_bits.py).
 """
 
 # Import modules
 from Bio import SeqIO
+import argparse
+import numpy as np
 import pandas as pd
-import sys
-import os
-import re
 
 # Define functions
 def pairwise_pi(sequence1, sequence2):
     # Returns a single per-site pi value for two DNA sequences of equal length.
     # Sites with missing data are completely ignored.
+    # Slow reference implementation, see pairwise_counts for the version used by this script.
     variable_sites = 0
     invariable_sites = 0
 
@@ -42,33 +51,63 @@ def pairwise_pi(sequence1, sequence2):
         pi = variable_sites/(invariable_sites + variable_sites)
     return pi
 
-# Take input
-if sys.argv[1].endswith(tuple([".fasta", "fa", "fas", "fna"])):
-    infile = sys.argv[1]
-else:
-    raise Exception("Invalid input arguments")
+def encode_alignment(sequences):
+    # Returns all sequences of an alignment as one taxa x sites matrix of upper case ASCII codes (uint8).
+    # Takes a list of strings, bytes or SeqRecords of equal length.
+    sequences = [seq.upper() if isinstance(seq, bytes) else str(getattr(seq, "seq", seq)).upper().encode("ascii") for seq in sequences]
+    lengths = set(len(seq) for seq in sequences)
+    assert len(lengths) <= 1, "Sequences in the alignment differ in length: {}".format(sorted(lengths))
+    length = lengths.pop() if lengths else 0
+    return np.frombuffer(b"".join(sequences), dtype = np.uint8).reshape(len(sequences), length)
 
-#outfile = infiles[i].split(".")
-#if re.match("fasta|fa|fas|fna", outfile[-1]):
-#    outfile = outfile[:-1]
-#outfile = ".".join(outfile) + ".csv"
+def pairwise_counts(matrix, missing = b"N-", rows = None):
+    # Returns two symmetric taxa x taxa matrices (int64): the number of differing sites and the number of valid sites per pair.
+    # Takes the output of encode_alignment. Sites with missing data in either sequence are ignored.
+    # Each count is a matrix product over the whole alignment, so all pairs are done in one pass.
+    # With rows (indices of taxa), returns rows x taxa matrices instead: only the pairs of those taxa with all taxa are counted.
+    valid = ~np.isin(matrix, np.frombuffer(missing, dtype = np.uint8))
+    valid_float = valid.astype(np.float64)
+    valid_sites = (valid_float if rows is None else valid_float[rows]) @ valid_float.T
+    identical_sites = np.zeros_like(valid_sites)
+    for symbol in np.unique(matrix[valid]):
+        state = (matrix == symbol).astype(np.float64)
+        identical_sites += (state if rows is None else state[rows]) @ state.T
+    return (valid_sites - identical_sites).astype(np.int64), valid_sites.astype(np.int64)
 
-# Calculate pairwise difference per file and output csv
+def pairwise_pi_matrix(ids, differences, valid_sites):
+    # Returns a DataFrame with per-site pi values from the output of pairwise_counts, NaN for pairs without valid sites.
+    with np.errstate(divide = "ignore", invalid = "ignore"):
+        pi = np.where(valid_sites > 0, differences / valid_sites, np.nan)
+    return pd.DataFrame(pi, columns = ids, index = ids)
 
-with open(infile, "r") as handle:
-    record_dict = SeqIO.to_dict(SeqIO.parse(handle, "fasta"))
-    ids = [record_dict[k].id for k in record_dict.keys()]
-    ids.sort()
-    df = pd.DataFrame(columns = ids, index = ids)
-    for i in df.index:
-        for c in df.columns:
-            df[i][c] = pairwise_pi(record_dict[i], record_dict[c])
-    #df.to_csv(outfile)
-    print(df.to_csv())
+def pairwise_pi_fasta(infile, iupac = False):
+    # Returns the matrix of per-site pi values for all sequences in a fasta alignment, sorted by sequence id.
+    # With iupac, ambiguity codes count as expected differences (nucleotide_bits.py) instead of as distinct symbols;
+    # sequences are then read as bytes and packed one at a time (4 bits per site).
+    if iupac:
+        from nucleotide_bits import read_packed, pairwise_bits
+        ids, packed, length = read_packed(infile)
+        mismatches, valid_sites, expected = pairwise_bits(packed)
+        np.fill_diagonal(expected, 0) # a sequence against itself is its heterozygosity, not a distance
+        return pairwise_pi_matrix(ids, expected, valid_sites)
+    with open(infile, "r") as handle:
+        record_dict = SeqIO.to_dict(SeqIO.parse(handle, "fasta"))
+    ids = sorted(record_dict.keys())
+    matrix = encode_alignment([record_dict[id] for id in ids])
+    differences, valid_sites = pairwise_counts(matrix)
+    return pairwise_pi_matrix(ids, differences, valid_sites)
 
-# Gather all csv for plots, genome-wide average etc (move to different script)
-#assert df.index.values.tolist() == df2.index.values.tolist()
-#assert df.columns.values.tolist() == df2.columns.values.tolist()
-#if None in df.to_numpy():
+if __name__ == "__main__":
+    # Take input
+    parser = argparse.ArgumentParser()
+    parser.add_argument("infile", help = "Alignment in fasta format")
+    parser.add_argument("--iupac", action = "store_true", help = "Count IUPAC ambiguity codes as expected differences between their bases")
+    args = parser.parse_args()
+    if args.infile.endswith(tuple([".fasta", "fa", "fas", "fna"])):
+        infile = args.infile
+    else:
+        raise Exception("Invalid input arguments")
 
-#(df1 + df2 + ... + dfn)/n
+    # Calculate pairwise difference per file and output csv
+    df = pairwise_pi_fasta(infile, args.iupac)
+    print(df.to_csv())
@@ -0,0 +1,275 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Script to calculate pairwise nucleotide differences (π) for all windows of the genome in one process,
+instead of running pairwise_pi.py once per window and writing one csv per window.
+Input is either the folder with window alignments made by createWindow_aln_JL.py (optionally restricted
+to the windows listed in a text file, e.g. filenames_informative.txt from check_Ncontent.py), or a window container (window_container.py),
+or the per-sample consensus genomes in fasta format, which are then cut into windows on the fly.
+Output is a single numpy .npz store with two window x pair matrices: the number of differing sites
+and the number of valid sites (no N or gap in either sequence). Per-window π is differences/valid_sites.
+The store also keeps a checksum of every sequence in every window.
+With --update previous.npz, counts are taken from an earlier store wherever they can be: per window, only the pairs
+of samples that are new (or whose sequence changed, by checksum) are counted, against all samples. Adding one genome
+to n genomes then costs n comparisons per window instead of n(n+1)/2. Samples no longer in the windows are dropped,
+windows not in the earlier store are counted in full. previous.npz may be missing (then everything is counted).
+With --replace, previous.npz is replaced by a hard link to the new store once that is written (atomically, so an
+interrupted run leaves the earlier store as it was), and the next run updates from this one.
+
+USAGE
+python3 pairwise_pi_genome.py --help
+python3 pairwise_pi_genome.py --windows /fullpath/windows/ --list filenames_informative.txt --output pairwise_pi.npz
+or
+python3 pairwise_pi_genome.py --genomes sample1.fa sample2.fa ... --size 100000 --output pairwise_pi.npz
+or
+python3 pairwise_pi_genome.py --container /fullpath/PREFIX --output pairwise_pi.npz
+python3 pairwise_pi_genome.py --windows /fullpath/windows/ --list filenames_informative.txt --update pairwise_pi_previous.npz --replace --output pairwise_pi.npz
+
+Created 18OCT26
+Update 18OCT26 - incremental mode (--update) for samples added to the metadata
+"""
+
+# Import modules
+import argparse
+import os
+import sys
+import zlib
+import numpy as np
+from multiprocessing import Pool
+from pairwise_pi import encode_alignment, pairwise_counts
+from fasta_windows import sample_name, iter_genome_windows, read_window
+
+# Define functions
+def save_store(outfile, samples, windows, pair_i, pair_j, differences, valid_sites, checksums = None):
+    # Writes a pairwise pi store. Pairs are given as indices into samples, counts as window x pair matrices,
+    # checksums (optional) as a window x sample matrix. Written under a temporary name first.
+    arrays = dict(
+        samples = np.asarray(samples, dtype = str),
+        windows = np.asarray(windows, dtype = str),
+        pair_i = np.asarray(pair_i, dtype = np.int32),
+        pair_j = np.asarray(pair_j, dtype = np.int32),
+        differences = np.asarray(differences, dtype = np.int32),
+        valid_sites = np.asarray(valid_sites, dtype = np.int32))
+    if checksums is not None:
+        arrays["checksums"] = np.asarray(checksums, dtype = np.int64)
+    with open(outfile + ".tmp", "wb") as out:
+        np.savez(out, **arrays)
+    os.replace(outfile + ".tmp", outfile)
+
+def load_store(infile):
+    # Returns a pairwise pi store as a dictionary of arrays.
+    with np.load(infile, allow_pickle = False) as store:
+        return {key: store[key] for key in store.files}
+
+def store_matrices(store, rows = None):
+    # Returns the summed differences and valid sites of a store as two square sample x sample matrices (int64).
+    # Rows optionally selects windows (indices or boolean mask).
+    n = len(store["samples"])
+    differences = store["differences"] if rows is None else store["differences"][rows]
+    valid_sites = store["valid_sites"] if rows is None else store["valid_sites"][rows]
+    matrices = []
+    for counts in (differences, valid_sites):
+        matrix = np.zeros((n, n), dtype = np.int64)
+        matrix[store["pair_i"], store["pair_j"]] = counts.sum(axis = 0, dtype = np.int64)
+        matrices.append(matrix + matrix.T)
+    return matrices[0], matrices[1]
+
+def sequence_checksums(matrix):
+    # Returns the crc32 of every sequence (row) of an encoded alignment (int64).
+    return np.array([zlib.crc32(row.tobytes()) for row in matrix], dtype = np.int64)
+
+def window_counts(matrix, pair_i, pair_j, previous = None):
+    # Returns the differences and valid sites of one encoded window for the requested pairs, and the checksums of its sequences.
+    # With previous (checksums of the same taxa in an earlier store, -1 for taxa not in it), only the pairs with a taxon
+    # whose checksum differs are counted, against all taxa; the other pairs are returned as -1, to be taken from the earlier store.
+    checksums = sequence_checksums(matrix)
+    if previous is None:
+        differences, valid_sites = pairwise_counts(matrix)
+        return differences[pair_i, pair_j], valid_sites[pair_i, pair_j], checksums
+    changed = checksums != previous
+    differences = np.full(len(pair_i), -1, dtype = np.int64)
+    valid_sites = np.full(len(pair_i), -1, dtype = np.int64)
+    rows = np.flatnonzero(changed)
+    if rows.size:
+        row_differences, row_valid_sites = pairwise_counts(matrix, rows = rows)
+        position = np.full(len(matrix), -1)
+        position[rows] = np.arange(len(rows))
+        todo = changed[pair_i] | changed[pair_j]
+        first = np.where(changed[pair_i], pair_i, pair_j)[todo]
+        second = np.where(changed[pair_i], pair_j, pair_i)[todo]
+        differences[todo] = row_differences[position[first], second]
+        valid_sites[todo] = row_valid_sites[position[first], second]
+    return differences, valid_sites, checksums
+
+def _window_file_counts(args):
+    # Pool worker for window alignment files.
+    infile, samples, pair_i, pair_j, previous = args
+    ids, seqs = read_window(infile)
+    assert ids == samples, "Window {} does not contain the same samples as the other windows".format(infile)
+    return window_counts(encode_alignment(seqs), pair_i, pair_j, previous)
+
+def _genome_window_counts(args):
+    # Pool worker for windows cut from genomes.
+    seqs, pair_i, pair_j, previous = args
+    return window_counts(encode_alignment(seqs), pair_i, pair_j, previous)
+
+def _container_window_counts(args):
+    # Pool worker for windows in a container. Opens the container once per worker process.
+    global _container
+    prefix, window, order, pair_i, pair_j, previous = args
+    if _container is None or _container.prefix != prefix:
+        from window_container import WindowContainer
+        _container = WindowContainer(prefix)
+    return window_counts(_container.get(window)[order], pair_i, pair_j, previous)
+
+_container = None
+
+def window_file_list(window_dir, listfile = None):
+    # Returns the paths of the window alignment files, either all fasta files in the folder or those in the list file.
+    if listfile:
+        with open(listfile) as filelist:
+            names = [os.path.basename(line.strip()) for line in filelist if line.strip()]
+    else:
+        names = sorted(name for name in os.listdir(window_dir) if name.endswith((".fasta", ".fa")))
+    return [os.path.join(window_dir, name) if window_dir else name for name in names]
+
+def strip_window_ext(filename):
+    # Returns the window name from a window file name.
+    name = os.path.basename(filename)
+    return ".".join(name.split(".")[:-1]) if name.endswith((".fasta", ".fa")) else name
+
+class PreviousStore(object):
+    # Counts of an earlier store, mapped onto the samples and pairs of a new run
+    def __init__(self, store, samples, pair_i, pair_j):
+        assert "checksums" in store, "The earlier store has no sequence checksums, it can't be updated"
+        self.store = store
+        old_index = {str(sample): i for i, sample in enumerate(store["samples"])}
+        self.sample_map = np.array([old_index.get(str(sample), -1) for sample in samples], dtype = np.int64)
+        self.window_index = {str(window): w for w, window in enumerate(store["windows"])}
+        # Column of every new pair in the earlier store, -1 for pairs with a new sample
+        n_old = len(store["samples"])
+        old_column = np.full((n_old, n_old), -1, dtype = np.int64)
+        old_column[store["pair_i"], store["pair_j"]] = np.arange(len(store["pair_i"]))
+        old_column[store["pair_j"], store["pair_i"]] = np.arange(len(store["pair_i"]))
+        i, j = self.sample_map[pair_i], self.sample_map[pair_j]
+        self.column = np.where((i >= 0) & (j >= 0), old_column[i, j], -1)
+
+    def new_samples(self, samples):
+        # Returns the samples that are not in the earlier store
+        return [sample for sample, i in zip(samples, self.sample_map) if i < 0]
+
+    def checksums(self, window):
+        # Returns the earlier checksums of the samples in a window (-1 for new samples), or None for a window not in the earlier store
+        w = self.window_index.get(window)
+        if w is None:
+            return None
+        return np.where(self.sample_map >= 0, self.store["checksums"][w][np.maximum(self.sample_map, 0)], -1)
+
+    def fill(self, window, differences, valid_sites):
+        # Replaces the counts not computed for a window (-1) by those of the earlier store. Returns the number of pairs reused.
+        reuse = differences < 0
+        if not reuse.any():
+            return 0
+        w = self.window_index[window]
+        column = self.column[reuse]
+        assert (column >= 0).all(), "Pairs of window {} are neither computed nor in the earlier store".format(window)
+        differences[reuse] = self.store["differences"][w, column]
+        valid_sites[reuse] = self.store["valid_sites"][w, column]
+        return int(reuse.sum())
+
+if __name__ == "__main__":
+    # Initialize parser
+    msg = "Compute per-window pairwise differences and valid sites for all windows at once, from a folder of window alignments (--windows) or from consensus genomes (--genomes)."
+    parser = argparse.ArgumentParser(description = msg)
+
+    # Adding arguments
+    parser.add_argument("-w", "--windows", metavar = "/fullpath/windows/", help = "Folder with window alignments in fasta format. Don't use together with --genomes.")
+    parser.add_argument("-l", "--list", metavar = "filenames.txt", help = "Optional text file listing the window files to use, one per line. Used with --windows.")
+    parser.add_argument("-c", "--container", metavar = "/fullpath/PREFIX", help = "Window container made with window_container.py or createWindow_aln_JL.py --container. Can be combined with --list.")
+    parser.add_argument("-g", "--genomes", nargs = "+", metavar = "sample.fa", help = "Consensus genomes in fasta format, one per sample. Don't use together with --windows.")
+    parser.add_argument("-s", "--size", type = int, default = 100000, help = "Window size in bp, used with --genomes. Default 100000.")
+    parser.add_argument("-p", "--processes", type = int, default = 1, help = "Number of worker processes. Default 1.")
+    parser.add_argument("-u", "--update", metavar = "previous.npz", help = "Earlier store: only pairs with new (or changed) samples are counted, the others are copied from it. Ignored if the file doesn't exist.")
+    parser.add_argument("-r", "--replace", action = "store_true", help = "With --update: replace the earlier store by the new one, once that is written.")
+    parser.add_argument("-o", "--output", required = True, metavar = "pairwise_pi.npz", help = "Output store in numpy .npz format.")
+
+    # Read arguments from command line
+    args = parser.parse_args()
+    assert (bool(args.windows) + bool(args.genomes) + bool(args.container)) == 1, "Provide one of --windows, --genomes or --container"
+    assert args.output.endswith(".npz"), "Output file must be a .npz file"
+    assert args.update or not args.replace, "--replace needs --update"
+
+    # Collect the windows and the samples
+    if args.windows:
+        infiles = window_file_list(args.windows, args.list)
+        assert infiles, "No window files found in " + args.windows
+        samples = read_window(infiles[0])[0]
+        windows = [strip_window_ext(infile) for infile in infiles]
+    elif args.container:
+        from window_container import WindowContainer
+        with WindowContainer(args.container) as container:
+            windows = [strip_window_ext(infile) for infile in window_file_list(None, args.list)] if args.list else list(container.windows)
+            samples = sorted(container.taxa)
+            order = np.array([container.taxa.index(sample) for sample in samples])
+    else:
+        samples = [sample_name(genome) for genome in args.genomes]
+        windows = []
+    pair_i, pair_j = np.triu_indices(len(samples), k = 1)
+
+    # Earlier store to update
+    previous = None
+    if args.update and os.path.exists(args.update):
+        previous = PreviousStore(load_store(args.update), samples, pair_i, pair_j)
+        print("Updating {}: {} new samples ({})".format(args.update, len(previous.new_samples(samples)), ", ".join(previous.new_samples(samples))), file = sys.stderr)
+
+    def checksums(window):
+        return previous.checksums(window) if previous else None
+
+    # Iterate over the windows and collect counts
+    if args.windows:
+        tasks = ((infile, samples, pair_i, pair_j, checksums(window)) for infile, window in zip(infiles, windows))
+        worker = _window_file_counts
+    elif args.container:
+        tasks = ((args.container, window, order, pair_i, pair_j, checksums(window)) for window in windows)
+        worker = _container_window_counts
+    else:
+        def genome_tasks():
+            for name, seqs in iter_genome_windows(args.genomes, args.size):
+                windows.append(name)
+                yield seqs, pair_i, pair_j, checksums(name)
+        tasks = genome_tasks()
+        worker = _genome_window_counts
+
+    if args.processes > 1:
+        pool = Pool(args.processes)
+        results = pool.imap(worker, tasks, chunksize = 16)
+    else:
+        pool = None
+        results = map(worker, tasks)
+    differences = []
+    valid_sites = []
+    sequence_sums = []
+    reused = 0
+    for window_differences, window_valid_sites, window_checksums in results:
+        if previous:
+            reused += previous.fill(windows[len(differences)], window_differences, window_valid_sites)
+        differences.append(window_differences)
+        valid_sites.append(window_valid_sites)
+        sequence_sums.append(window_checksums)
+    if pool:
+        pool.close()
+        pool.join()
+
+    n_pairs = len(pair_i)
+    save_store(args.output, samples, windows, pair_i, pair_j,
+        np.array(differences).reshape(-1, n_pairs), np.array(valid_sites).reshape(-1, n_pairs),
+        np.array(sequence_sums).reshape(-1, len(samples)))
+    print("Processed {} windows for {} samples ({} pairs)".format(len(windows), len(samples), n_pairs), file = sys.stderr)
+    if previous:
+        print("Counted {} and reused {} window pairs".format(len(windows) * n_pairs - reused, reused), file = sys.stderr)
+    if args.replace:
+        if os.path.lexists(args.update + ".tmp"):
+            os.remove(args.update + ".tmp")
+        os.link(args.output, args.update + ".tmp")
+        os.replace(args.update + ".tmp", args.update)
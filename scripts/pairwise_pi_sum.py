@@ -5,70 +5,162 @@ DESCRIPTION
 Script to sum per-site pairwise nucleotide differences (π).
 Used to take the average, but a sum is weighted and therefore more accurate.
 Input is a series of csv files generated with pairwise_pi.py,
-or text file listing the path to csv files one per line.
-Output is a matrix of average pi values in csv format,
+or text file listing the path to csv files one per line,
+or a store generated with pairwise_pi_genome.py.
+Output is a matrix of summed pi values in csv format,
 printed to screen or to file with -o option.
+For a store, the output is the genome-wide per-site pi of each pair:
+summed differences divided by summed valid sites.
 
 USAGE
 python3 pairwise_pi_sum.py --help
 python3 pairwise_pi_sum.py -l filenames.txt -o outfile.csv
 or
 python3 pairwise_pi_sum.py -i file1.csv file2.csv -o outfile.csv
+or
+python3 pairwise_pi_sum.py -s pairwise_pi.npz -o outfile.csv
 
 Created 18JAN21
 Update 28FEB23 - sum instead of average, abandon intention to plot results (use THEx instead)
+Update 18OCT26 - csv files are parsed in a thread (or process) pool and reduced into numerator/denominator arrays,
+skipped windows are reported, input from pairwise_pi_genome.py stores
 Author: Jonas Lescroart
 """
 
 # Import modules
 import pandas as pd
+import numpy as np
 import argparse
-import os
-
-# Initialize parser
-msg = "Use the output csv files of pairwise_pi.py and input here as either separate files (-i file1.csv file2.csv...) or with a text file containing the full path to all the csv files (-l filenames.txt). If no output file specified, prints to std out."
-parser = argparse.ArgumentParser(description = msg)
-
-# Adding arguments
-parser.add_argument("-l", "--list", metavar = "filenames.txt", help = "Textfile listing the absolute paths to input csv files. Don't use together with -i.")
-parser.add_argument("-i", "--input",
-    nargs = "+",
-    metavar = "input.csv",
-    help = "One or multiple input files in csv format. Don't use together with -l.")
-parser.add_argument("-o", "--output", help = "Absolute path to output file in csv format.")
-
-# Read arguments from command line
-args = parser.parse_args()
-print(args)
-
-if args.input:
-    infiles = args.input
-
-if args.list:
-    with open(args.list) as filelist:
-        infiles = [infile.strip() for infile in filelist.readlines()]
-
-if args.output:
-    outfile = args.output
-
-# Assert that input files are csv format
-for infile in infiles:
-    if not infile.endswith(".csv"):
-        raise Exception("Invalid input files: must be .csv files")
-
-# Iterate over csv files and sum pi values
-for i in range(len(infiles)):
-    csv = pd.read_csv(infiles[i], sep = ",", index_col = 0, na_values = ["None"])
-    if csv.isnull().values.any():
-        pass
+import csv
+import sys
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+
+# Define functions
+def read_pi_csv(infile):
+    # Returns (infile, sample ids, matrix of pi values, error) for one csv file made by pairwise_pi.py.
+    # Missing values (empty or None) become NaN. Errors are returned rather than raised, so the reducer can report them.
+    try:
+        with open(infile, newline = "") as handle:
+            rows = [row for row in csv.reader(handle) if row]
+        ids = rows[0][1:]
+        if [row[0] for row in rows[1:]] != ids:
+            return infile, ids, None, "row and column names differ"
+        values = np.array([[float(value) if value not in ("", "None") else np.nan for value in row[1:]] for row in rows[1:]], dtype = np.float64)
+        if values.shape != (len(ids), len(ids)):
+            return infile, ids, None, "matrix is not square"
+        return infile, ids, values, None
+    except (OSError, ValueError, IndexError) as error:
+        return infile, None, None, "unreadable ({})".format(type(error).__name__)
+
+def reduce_pi(parsed, pairwise_complete = False):
+    # Accumulates parsed csv files into a numerator (float64, sum of pi) and a denominator (int64, number of windows) per pair.
+    # By default a window with any missing value is skipped entirely, so that all pairs are summed over the same windows.
+    # With pairwise_complete, such a window still contributes to the pairs that do have a value.
+    # Returns sample ids, numerator, denominator, number of windows used and a Counter with the reasons windows were skipped.
+    ids = None
+    numerator = None
+    denominator = None
+    used = 0
+    skipped = Counter()
+    for infile, window_ids, values, error in parsed:
+        if error:
+            skipped[error] += 1
+            continue
+        if ids is None:
+            ids = window_ids
+            numerator = np.zeros(values.shape, dtype = np.float64)
+            denominator = np.zeros(values.shape, dtype = np.int64)
+        if window_ids != ids:
+            skipped["different samples than first window"] += 1
+            continue
+        present = ~np.isnan(values)
+        if not present.all():
+            if not pairwise_complete:
+                skipped["missing values"] += 1
+                continue
+            if not present.any():
+                skipped["no values"] += 1
+                continue
+        numerator += np.where(present, values, 0.0)
+        denominator += present
+        used += 1
+    return ids, numerator, denominator, used, skipped
+
+def reduce_store(infile):
+    # Returns sample ids, numerator (summed differences), denominator (summed valid sites), number of windows
+    # and a Counter with windows lacking valid sites for some pair, for a store made by pairwise_pi_genome.py.
+    from pairwise_pi_genome import load_store, store_matrices
+    store = load_store(infile)
+    numerator, denominator = store_matrices(store)
+    incomplete = Counter()
+    n_incomplete = int((store["valid_sites"] == 0).any(axis = 1).sum())
+    if n_incomplete:
+        incomplete["pairs without valid sites (kept)"] = n_incomplete
+    return store["samples"].tolist(), numerator, denominator, len(store["windows"]), incomplete
+
+if __name__ == "__main__":
+    # Initialize parser
+    msg = "Use the output csv files of pairwise_pi.py and input here as either separate files (-i file1.csv file2.csv...) or with a text file containing the full path to all the csv files (-l filenames.txt), or use a store from pairwise_pi_genome.py (-s pairwise_pi.npz). If no output file specified, prints to std out."
+    parser = argparse.ArgumentParser(description = msg)
+
+    # Adding arguments
+    parser.add_argument("-l", "--list", metavar = "filenames.txt", help = "Textfile listing the absolute paths to input csv files. Don't use together with -i.")
+    parser.add_argument("-i", "--input",
+        nargs = "+",
+        metavar = "input.csv",
+        help = "One or multiple input files in csv format. Don't use together with -l.")
+    parser.add_argument("-s", "--store", metavar = "pairwise_pi.npz", help = "Store made by pairwise_pi_genome.py. Don't use together with -i or -l.")
+    parser.add_argument("-o", "--output", help = "Absolute path to output file in csv format.")
+    parser.add_argument("-t", "--threads", type = int, default = 8, help = "Number of workers reading csv files in parallel. Default 8.")
+    parser.add_argument("--processes", action = "store_true", help = "Use worker processes instead of threads to read csv files.")
+    parser.add_argument("--mean", action = "store_true", help = "Output the mean pi per window instead of the sum.")
+    parser.add_argument("--pairwise-complete", action = "store_true", help = "Keep windows with missing values for the pairs that do have a value. Use with --mean, as pairs are then summed over different numbers of windows.")
+
+    # Read arguments from command line
+    args = parser.parse_args()
+    print(args, file = sys.stderr)
+
+    if args.store:
+        ids, numerator, denominator, used, skipped = reduce_store(args.store)
+        n_windows = used
+        with np.errstate(divide = "ignore", invalid = "ignore"):
+            total = np.where(denominator > 0, numerator / denominator, np.nan)
+        np.fill_diagonal(total, 0.0)
     else:
-        if "total" not in globals():
-            total = csv
+        if args.input:
+            infiles = args.input
+
+        if args.list:
+            with open(args.list) as filelist:
+                infiles = [infile.strip() for infile in filelist.readlines() if infile.strip()]
+
+        # Assert that input files are csv format
+        for infile in infiles:
+            if not infile.endswith(".csv"):
+                raise Exception("Invalid input files: must be .csv files")
+
+        # Parse csv files in parallel and sum pi values in input order
+        executor = ProcessPoolExecutor if args.processes else ThreadPoolExecutor
+        with executor(max_workers = args.threads) as pool:
+            parsed = pool.map(read_pi_csv, infiles, chunksize = 64) if args.processes else pool.map(read_pi_csv, infiles)
+            ids, numerator, denominator, used, skipped = reduce_pi(parsed, args.pairwise_complete)
+        n_windows = len(infiles)
+        assert ids is not None, "None of the input files could be read"
+        if args.mean:
+            with np.errstate(divide = "ignore", invalid = "ignore"):
+                total = np.where(denominator > 0, numerator / denominator, np.nan)
         else:
-            assert csv.index.values.tolist() == total.index.values.tolist()
-            assert csv.columns.values.tolist() == total.columns.values.tolist()
-            total += csv
+            total = numerator
 
-# Output sum pi values
-total.to_csv(outfile)
+    # Report windows used and skipped
+    print("Summed {} of {} windows, skipped {}".format(used, n_windows, sum(v for k, v in skipped.items() if not k.endswith("(kept)"))), file = sys.stderr)
+    for reason, count in skipped.most_common():
+        print("    {}: {}".format(reason, count), file = sys.stderr)
 
+    # Output sum pi values
+    total = pd.DataFrame(total, index = ids, columns = ids)
+    if args.output:
+        total.to_csv(args.output)
+    else:
+        print(total.to_csv())
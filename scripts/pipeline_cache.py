@@ -0,0 +1,172 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Cached loading of the inputs every Snakefile reads while it is parsed: the genomes metadata file, the reference .fai
+and lists like filenames.txt (genomic fragments) and autosomes.txt.
+Each file is parsed once; the result is pickled in a cache directory (default .snakemake/input_cache in the working
+directory) and reused as long as the size and modification time of the file are the same. Snakemake parses the
+Snakefile again for every cluster job, so this saves reading tens of thousands of fragment names each time.
+PipelineInputs gives lazy access to the values the Snakefiles use (samples after exclude, figure IDs, chromosomes,
+autosomes, genomic fragments): a file is only read (or loaded from the cache) when its value is used.
+
+USAGE
+In a Snakefile:
+    sys.path.insert(0, os.path.dirname(config["scripts"]["pipeline_cache"]))
+    from pipeline_cache import PipelineInputs
+    inputs = PipelineInputs(config)
+    metadata = inputs.metadata
+    unique_id = inputs.unique_id
+    unique_gf = inputs.fragments
+
+To fill the cache beforehand, or to check a file:
+python pipeline_cache.py --metadata genomes_metadata.tsv --fai ref.fna.fai --list filenames.txt [--cache-dir DIR] [--clear]
+
+Author: Jonas Lescroart
+Created 18OCT26
+"""
+
+#import modules
+import argparse
+import hashlib
+import os
+import pickle
+import sys
+import pandas as pd
+
+#define functions
+VERSION = 1 # change when parsers change, to ignore old cache files
+CACHE_DIR = os.path.join(".snakemake", "input_cache")
+
+def strip_ext(file_str):
+    # Same as strip_ext of the Snakefiles: removes .gz and then .fasta, .fa or .fna
+    bits = file_str.split(".")
+    if bits[-1].startswith("gz"):
+        bits = bits[:-1]
+    if bits[-1].startswith(("fasta", "fa", "fna")):
+        bits = bits[:-1]
+    return ".".join(bits)
+
+def read_metadata(infile, encoding = "latin-1"):
+    # Returns the genomes metadata file as DataFrame indexed by unique_id (also kept as column), as in the Snakefiles
+    return pd.read_csv(infile, sep = "\t", engine = "python", encoding = encoding).set_index("unique_id", drop = False)
+
+def read_fai(infile):
+    # Returns the sequence names of a .fai file, in order
+    with open(infile) as fai:
+        return [line.split("\t", 1)[0] for line in fai if line.strip()]
+
+def read_list(infile, encoding = "latin-1"):
+    # Returns the first column of a text file (one name per line, like autosomes.txt) as strings
+    with open(infile, encoding = encoding) as f:
+        return [line.split()[0] for line in f if line.strip()]
+
+def read_fragments(infile):
+    # Returns the names of the genomic fragments in filenames.txt, without extension (unique_gf of the Snakefiles)
+    with open(infile) as f:
+        return [strip_ext(line.strip()) for line in f if line.strip()]
+
+def cache_file(infile, parser, args, cache_dir):
+    # Returns the cache file for a parser and its arguments on infile
+    key = repr((os.path.abspath(infile), parser.__name__, args, VERSION)).encode()
+    return os.path.join(cache_dir, parser.__name__ + "_" + hashlib.sha1(key).hexdigest() + ".pkl")
+
+def cached(infile, parser, *args, cache_dir = CACHE_DIR):
+    # Returns parser(infile, *args), from the cache if infile has the same size and modification time as when it was cached
+    stat = os.stat(infile)
+    stamp = (stat.st_size, stat.st_mtime_ns)
+    path = cache_file(infile, parser, args, cache_dir)
+    try:
+        with open(path, "rb") as f:
+            saved_stamp, value = pickle.load(f)
+        if saved_stamp == stamp:
+            return value
+    except Exception:
+        pass
+    value = parser(infile, *args)
+    try:
+        os.makedirs(cache_dir, exist_ok = True)
+        tmp = "{}.{}.tmp".format(path, os.getpid())
+        with open(tmp, "wb") as f:
+            pickle.dump((stamp, value), f, protocol = pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path) # atomic, so parallel snakemake processes never read half a file
+    except OSError:
+        pass # read-only working directory: works without cache
+    return value
+
+class PipelineInputs:
+    # Lazy, cached access to the inputs of a Snakefile config
+    def __init__(self, config, encoding = "latin-1", cache_dir = CACHE_DIR):
+        self.config = config
+        self.encoding = encoding
+        self.cache_dir = cache_dir
+        self._values = {}
+
+    def _lazy(self, name, function):
+        # Returns the value of name, computed with function on first use
+        if name not in self._values:
+            self._values[name] = function()
+        return self._values[name]
+
+    def cached(self, infile, parser, *args):
+        # Returns parser(infile, *args) through the cache
+        return cached(infile, parser, *args, cache_dir = self.cache_dir)
+
+    @property
+    def metadata(self):
+        # Metadata DataFrame indexed by unique_id
+        return self._lazy("metadata", lambda: self.cached(self.config["metadata"], read_metadata, self.encoding))
+
+    @property
+    def unique_id(self):
+        # Samples of the metadata, without config["exclude"]; every excluded ID must be in the metadata
+        return self._lazy("unique_id", self._unique_id)
+
+    def _unique_id(self):
+        samples = self.metadata["unique_id"].astype(str).tolist()
+        exclude = set(self.config.get("exclude", []))
+        missing = sorted(exclude.difference(samples))
+        assert not missing, "IDs in exclude not found in {}: {}".format(self.config["metadata"], ", ".join(missing))
+        return [id for id in samples if id not in exclude]
+
+    @property
+    def figure_id(self):
+        # Figure IDs of unique_id, in the same order
+        return self._lazy("figure_id", lambda: [self.metadata.loc[id]["figure_id"] for id in self.unique_id])
+
+    @property
+    def chromosomes(self):
+        # Sequence names of the reference .fai (next to the reference as .fna.fai)
+        fai = "{ref}.fna.fai".format(ref = strip_ext(self.config["ref"]["file"]))
+        return self._lazy("chromosomes", lambda: self.cached(fai, read_fai))
+
+    @property
+    def autosomes(self):
+        # Chromosomes in config["input"]["auto"]
+        return self._lazy("autosomes", lambda: self.cached(self.config["input"]["auto"], read_list, self.encoding))
+
+    @property
+    def fragments(self):
+        # Genomic fragments in config["input"]["filenames"], without extension
+        return self._lazy("fragments", lambda: self.cached(self.config["input"]["filenames"], read_fragments))
+
+if __name__ == "__main__":
+    #take command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--metadata', help="Genomes metadata file", type=str)
+    parser.add_argument('--fai', help="Reference .fai file", type=str)
+    parser.add_argument('--list', help="List of names, like filenames.txt (genomic fragments)", type=str)
+    parser.add_argument('--cache-dir', help="Cache directory, default .snakemake/input_cache (in the Snakefile directory)", default=CACHE_DIR, type=str)
+    parser.add_argument('--clear', help="Remove all cache files first", action='store_true')
+    args = parser.parse_args()
+
+    if args.clear and os.path.isdir(args.cache_dir):
+        for name in os.listdir(args.cache_dir):
+            if name.endswith(".pkl"):
+                os.remove(os.path.join(args.cache_dir, name))
+    if args.metadata:
+        print("{}: {} samples".format(args.metadata, len(cached(args.metadata, read_metadata, "latin-1", cache_dir = args.cache_dir))), file = sys.stderr)
+    if args.fai:
+        print("{}: {} sequences".format(args.fai, len(cached(args.fai, read_fai, cache_dir = args.cache_dir))), file = sys.stderr)
+    if args.list:
+        print("{}: {} fragments".format(args.list, len(cached(args.list, read_fragments, cache_dir = args.cache_dir))), file = sys.stderr)
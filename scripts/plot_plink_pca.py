@@ -1,87 +1,186 @@
 #!/usr/bin/env python
 
 """
-DESCRIPTION 
+DESCRIPTION
 Create a PCA plot from PLINK2 output .eigenvec and .eigenval files.
+With --pcs 3 or more, all pairs of the first PCs are drawn as a grid in one figure.
+Samples can be coloured by a column of the genomes metadata file (matched on figure_id by default).
+For large cohorts, points are rasterized and labels are thinned to one per area of the plot,
+so the figure stays small and fast to draw (see --labels and --rasterize).
+The output format follows the extension of the output file (svg, pdf, png).
 
 USAGE
-plot_plink_pca.py /.../PREFIX.eigenvec /.../PREFIX.eigenval OUTGROUP_ID
+plot_plink_pca.py --vec /.../PREFIX.eigenvec --val /.../PREFIX.eigenval [--output /.../PREFIX.svg]
+Optional: --pcs 4 --metadata genomes_metadata_*.tsv --color-by species --labels thin
 Use absolute paths.
 
 AUTHOR AND CHANGE LOG
 Written by Jonas Lescroart on 27 January 2022
+18OCT26: explicit dtypes, grid of PC pairs (--pcs), colour by metadata column, rasterized points and optional or thinned labels, output format from extension
 """
 
 # Import modules
 import pandas as pd
+import numpy as np
+import matplotlib
+matplotlib.use("Agg")
+matplotlib.rcParams["svg.fonttype"] = "none" # labels as svg text instead of glyph paths
 import matplotlib.pyplot as plt
+from matplotlib.lines import Line2D
 import argparse
 import os
 
-# Initialize parser
-msg = "Python script to plot a PCA from PLINK2 --pca output."
-parser = argparse.ArgumentParser(description = msg)
-
-# Adding arguments
-parser.add_argument(
-    "--vec", 
-    metavar = "/.../PREFIX.eigenvec", 
-    help = "PLINK2 output: absolute path to PREFIX.eigenvec file.")
-parser.add_argument(
-    "--val", 
-    metavar = "/.../PREFIX.eigenval", 
-    help = "PLINK2 output: absolute path to PREFIX.eigenval file.")
-parser.add_argument(
-    "-o", "--output", 
-    metavar = "/.../PREFIX.svg", 
-    help = "Absolute path to output file in svg format.")
-
-# Read arguments from command line
-args = parser.parse_args()
-
-# Assertions
-assert args.vec.endswith(".eigenvec")
-assert args.val.endswith(".eigenval")
-if args.output:
-    assert args.output.endswith(".svg")
-    outfile = args.output
-else:
-    outfile =  args.vec[:-9] + ".svg"
-
-# Read input data
-eigenvecs = pd.read_csv(args.vec, sep='\t', header=0)
-eigenvecs['#FID']
-eigenvecs = eigenvecs.set_index(eigenvecs['#FID'])
-eigenvecs.pop('IID')
-eigenvecs.pop('#FID')
-
-with open(args.val,"r") as f:
-    eigenvals = f.readlines()
-
-# Dictionary linking PCs to their percentage of variation
-column_names = eigenvecs.columns.values.tolist()
-eigenvals = dict(zip(column_names, eigenvals))
-for k in eigenvals:
-    eigenvals[k] = float(eigenvals[k].rstrip())
-sum_eigenvals = sum(eigenvals.values())
-for k in eigenvals:
-    eigenvals[k] = round((eigenvals[k]/sum_eigenvals) * 100)
-
-# Create plot
-pcx = 'PC1'
-pcy = 'PC2'
-
-fig = plt.figure(figsize=(6,6))
-ax = fig.add_subplot(1, 1, 1)
-
-plt.scatter(eigenvecs[pcx], eigenvecs[pcy],c='red')
-ax.set_xlabel(pcx + " (" + str(eigenvals[pcx]) + "%)")
-ax.set_ylabel(pcy + " (" + str(eigenvals[pcy]) + "%)")
-
-for i, sample_ID in enumerate(eigenvecs.index.values):
-    ax.annotate(sample_ID, (eigenvecs[pcx][i], eigenvecs[pcy][i]))
-#add PC3-4 to the plot.
-
-# Save plot
-plt.savefig(outfile, format = "svg")
-
+# Define functions
+def read_eigenvec(infile):
+    # Returns the eigenvectors as DataFrame of float64 indexed by sample ID (#FID, or #IID without FID column)
+    with open(infile) as f:
+        header = f.readline().rstrip("\n").split("\t")
+    id_columns = [column for column in header if column in ("#FID", "FID", "#IID", "IID")]
+    dtypes = {column: (str if column in id_columns else np.float64) for column in header}
+    eigenvecs = pd.read_csv(infile, sep = "\t", header = 0, dtype = dtypes, engine = "c")
+    eigenvecs = eigenvecs.set_index(id_columns[0])
+    eigenvecs.index.name = "sample"
+    return eigenvecs.drop(columns = id_columns[1:])
+
+def variance_explained(infile, pcs):
+    # Returns a dictionary linking PCs to their rounded percentage of variation
+    eigenvals = np.loadtxt(infile, dtype = np.float64, ndmin = 1)
+    percentages = np.round(eigenvals / eigenvals.sum() * 100).astype(int)
+    return dict(zip(pcs, percentages))
+
+def sample_colors(samples, metadata, column, id_column = "figure_id"):
+    # Returns a colour per sample and legend handles, by the values of a metadata column. Samples without metadata are grey.
+    table = pd.read_csv(metadata, sep = "\t", engine = "python", encoding = "latin-1", dtype = str)
+    values = table.drop_duplicates(id_column).set_index(id_column)[column].reindex(samples).fillna("NA")
+    categories = sorted(set(values) - {"NA"})
+    cmap = plt.get_cmap("tab10" if len(categories) <= 10 else "tab20")
+    palette = {category: cmap(i % cmap.N) for i, category in enumerate(categories)}
+    palette["NA"] = (0.6, 0.6, 0.6, 1.0)
+    colors = np.array([palette[value] for value in values])
+    handles = [Line2D([], [], marker = "o", linestyle = "", color = palette[category], label = category) for category in categories]
+    if "NA" in set(values):
+        handles.append(Line2D([], [], marker = "o", linestyle = "", color = palette["NA"], label = "NA"))
+    return colors, handles
+
+def thin_labels(x, y, bins = 12):
+    # Returns the indices of the samples to label: the first sample in every cell of a bins x bins grid over the plot
+    def cell(values):
+        span = values.max() - values.min()
+        if span == 0:
+            return np.zeros(len(values), dtype = np.int64)
+        return np.minimum(((values - values.min()) / span * bins).astype(np.int64), bins - 1)
+    cells = cell(x) * bins + cell(y)
+    return np.sort(np.unique(cells, return_index = True)[1])
+
+def plot_pair(ax, eigenvecs, eigenvals, pcx, pcy, colors, labels, rasterize):
+    # Draws one PC pair on ax, with one scatter layer and the labels of the chosen samples
+    x = eigenvecs[pcx].values
+    y = eigenvecs[pcy].values
+    ax.scatter(x, y, c = colors, s = 20 if len(x) <= 100 else 6, linewidths = 0, rasterized = rasterize)
+    ax.set_xlabel(pcx + " (" + str(eigenvals[pcx]) + "%)")
+    ax.set_ylabel(pcy + " (" + str(eigenvals[pcy]) + "%)")
+    if labels == "all":
+        shown = np.arange(len(x))
+    elif labels == "thin":
+        shown = thin_labels(x, y)
+    else:
+        shown = []
+    sample_IDs = eigenvecs.index.values
+    for i in shown:
+        ax.annotate(sample_IDs[i], (x[i], y[i]), fontsize = 8 if len(x) <= 100 else 5)
+
+if __name__ == "__main__":
+    # Initialize parser
+    msg = "Python script to plot a PCA from PLINK2 --pca output."
+    parser = argparse.ArgumentParser(description = msg)
+
+    # Adding arguments
+    parser.add_argument(
+        "--vec",
+        metavar = "/.../PREFIX.eigenvec",
+        help = "PLINK2 output: absolute path to PREFIX.eigenvec file.")
+    parser.add_argument(
+        "--val",
+        metavar = "/.../PREFIX.eigenval",
+        help = "PLINK2 output: absolute path to PREFIX.eigenval file.")
+    parser.add_argument(
+        "-o", "--output",
+        metavar = "/.../PREFIX.svg",
+        help = "Absolute path to output file, format from the extension (svg, pdf, png). Default PREFIX.svg.")
+    parser.add_argument(
+        "--pcs",
+        type = int,
+        default = 2,
+        help = "Number of PCs to plot. 2 plots PC1 and PC2, more plots a grid of all pairs. Default 2.")
+    parser.add_argument(
+        "--metadata",
+        metavar = "genomes_metadata_*.tsv",
+        help = "Metadata file to colour samples by --color-by.")
+    parser.add_argument(
+        "--color-by",
+        default = "species",
+        help = "Metadata column to colour samples by. Default species.")
+    parser.add_argument(
+        "--id-column",
+        default = "figure_id",
+        help = "Metadata column with the sample IDs of the eigenvec file. Default figure_id.")
+    parser.add_argument(
+        "--labels",
+        choices = ["auto", "all", "thin", "none"],
+        default = "auto",
+        help = "Sample labels: all, thin (at most one per area of the plot) or none. Default auto: all up to 100 samples, thin above.")
+    parser.add_argument(
+        "--rasterize",
+        choices = ["auto", "yes", "no"],
+        default = "auto",
+        help = "Rasterize the points in vector output. Default auto: above 100 samples.")
+    parser.add_argument(
+        "--dpi",
+        type = int,
+        default = 150,
+        help = "Resolution of rasterized points and png output. Default 150.")
+
+    # Read arguments from command line
+    args = parser.parse_args()
+
+    # Assertions
+    assert args.vec.endswith(".eigenvec")
+    assert args.val.endswith(".eigenval")
+    if args.output:
+        outfile = args.output
+    else:
+        outfile =  args.vec[:-9] + ".svg"
+    fmt = os.path.splitext(outfile)[1][1:].lower()
+    assert fmt in ("svg", "pdf", "png"), "Output file should end with .svg, .pdf or .png"
+
+    # Read input data
+    eigenvecs = read_eigenvec(args.vec)
+    pcs = eigenvecs.columns.values.tolist()
+    assert 2 <= args.pcs <= len(pcs), "--pcs should be between 2 and {}".format(len(pcs))
+    eigenvals = variance_explained(args.val, pcs)
+    n = len(eigenvecs)
+    labels = args.labels if args.labels != "auto" else ("all" if n <= 100 else "thin")
+    rasterize = args.rasterize == "yes" or (args.rasterize == "auto" and n > 100)
+    if args.metadata:
+        colors, handles = sample_colors(eigenvecs.index.values, args.metadata, args.color_by, args.id_column)
+    else:
+        colors, handles = "red", []
+
+    # Create plot: PC1/PC2, or lower triangle of PC pairs
+    k = args.pcs - 1
+    fig, axes = plt.subplots(k, k, figsize = (6, 6) if k == 1 else (4 * k, 4 * k), squeeze = False)
+    for row in range(k):
+        for col in range(k):
+            if col > row:
+                axes[row][col].axis("off")
+                continue
+            plot_pair(axes[row][col], eigenvecs, eigenvals, pcs[col], pcs[row + 1], colors, labels, rasterize)
+    if handles:
+        if k == 1:
+            axes[0][0].legend(handles = handles, title = args.color_by, fontsize = 8)
+        else:
+            axes[0][k - 1].legend(handles = handles, title = args.color_by, loc = "upper right")
+    fig.tight_layout()
+
+    # Save plot
+    fig.savefig(outfile, format = fmt, dpi = args.dpi)
@@ -0,0 +1,140 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Script to replace sample IDs by other IDs (by default unique_id by figure_id of the genomes metadata file) in text files:
+distance matrices, newick and nexus trees, fasta files, tables.
+All IDs are replaced in one pass per file with one compiled regular expression (longest IDs first), and only as whole
+tokens: an ID is not replaced inside a longer ID or name (e.g. LPA-1 in wmLPA-1 or LPA-10). Replaced text is not
+searched again, so a new ID that contains an old one is left alone.
+Files can be given one by one, as list, or as directories, and are all done in one process (or a pool with --processes).
+
+USAGE
+python translate_ids.py --metadata genomes_metadata.tsv --input tree_unique_id.nwk --output tree.nwk
+python translate_ids.py --metadata genomes_metadata.tsv --input /fullpath/dir_or_files ... --outdir /fullpath/outdir [--suffix _unique_id]
+python translate_ids.py --metadata genomes_metadata.tsv --list filenames.txt --outdir /fullpath/outdir [--suffix _unique_id]
+    Output files get the name of the input file, without --suffix (e.g. WINDOW_unique_id.csv -> WINDOW.csv).
+Optional: --from unique_id --to figure_id --exclude Fch-1a --encoding utf-8 --processes 4
+In the Snakefiles, the unique_id2figure_id rules call this script from shell with --exclude config["exclude"].
+
+from translate_ids import IdTranslator
+translator = IdTranslator({"LPA-6": "Lpardalis_6"})
+translator.translate_file(infile, outfile)
+
+Author: Jonas Lescroart
+Created 18OCT26
+"""
+
+#import modules
+import argparse
+import os
+import re
+import sys
+import pandas as pd
+from multiprocessing import Pool
+
+#define functions
+TOKEN = r"[\w-]" # characters that can be part of an ID; IDs are only replaced when not next to one of these
+
+def read_id_map(metadata, source = "unique_id", target = "figure_id", exclude = (), encoding = "latin-1"):
+    # Returns a dictionary from the source to the target column of the metadata file
+    table = pd.read_csv(metadata, sep = "\t", engine = "python", encoding = encoding, dtype = str)
+    table = table.dropna(subset = [source, target])
+    return {old: new for old, new in zip(table[source], table[target]) if old not in exclude}
+
+class IdTranslator:
+    # Replaces all IDs of a dictionary in one pass, as whole tokens
+    def __init__(self, mapping):
+        self.mapping = dict(mapping)
+        ids = sorted(self.mapping, key = len, reverse = True)
+        alternation = "|".join(re.escape(id) for id in ids) if ids else "(?!)"
+        self.pattern = re.compile("(?<!" + TOKEN + ")(?:" + alternation + ")(?!" + TOKEN + ")")
+
+    def translate(self, text):
+        # Returns text with all IDs replaced
+        return self.pattern.sub(lambda match: self.mapping[match.group(0)], text)
+
+    def translate_file(self, infile, outfile):
+        # Writes infile with all IDs replaced to outfile (can be the same file); a last line without newline gets one
+        with open(infile) as f:
+            text = f.read()
+        text = self.translate(text)
+        if text and not text.endswith("\n"):
+            text += "\n"
+        with open(outfile, "w") as out:
+            out.write(text)
+
+    def translate_files(self, pairs, processes = 1):
+        # Translates (infile, outfile) pairs, in one process or in a pool of processes. Returns the number of files.
+        pairs = list(pairs)
+        if processes > 1 and len(pairs) > 1:
+            with Pool(processes, initializer = _init_worker, initargs = (self.mapping,)) as pool:
+                for _ in pool.imap_unordered(_translate_file, pairs, chunksize = 64):
+                    pass
+        else:
+            for infile, outfile in pairs:
+                self.translate_file(infile, outfile)
+        return len(pairs)
+
+_translator = None # one translator per worker process
+
+def _init_worker(mapping):
+    # Pool initializer
+    global _translator
+    _translator = IdTranslator(mapping)
+
+def _translate_file(pair):
+    # Pool worker
+    _translator.translate_file(*pair)
+
+def input_files(inputs):
+    # Returns the files of a list of files and directories (all files in a directory, sorted, not recursive)
+    files = []
+    for path in inputs:
+        if os.path.isdir(path):
+            files += sorted(os.path.join(path, name) for name in os.listdir(path) if os.path.isfile(os.path.join(path, name)))
+        else:
+            files.append(path)
+    return files
+
+def output_file(infile, outdir, suffix = ""):
+    # Returns the output file in outdir for infile, with suffix removed from the name (before the extension)
+    stem, ext = os.path.splitext(os.path.basename(infile))
+    if suffix and stem.endswith(suffix):
+        stem = stem[:-len(suffix)]
+    return os.path.join(outdir, stem + ext)
+
+if __name__ == "__main__":
+    #take command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--metadata', help="Tab-separated metadata file with the ID columns", required=True, type=str)
+    parser.add_argument('--input', help="Files and/or directories to translate", nargs='+', default=[], type=str)
+    parser.add_argument('--list', help="Text file with files to translate, one per line (for more files than fit on the command line)", type=str)
+    parser.add_argument('--output', help="Output file, for a single input file", type=str)
+    parser.add_argument('--outdir', help="Output directory, for any number of input files", type=str)
+    parser.add_argument('--suffix', help="Remove this suffix from the output file names with --outdir, e.g. _unique_id", default="", type=str)
+    parser.add_argument('--from', dest='source', help="Metadata column with the IDs in the files, default unique_id", default="unique_id", type=str)
+    parser.add_argument('--to', dest='target', help="Metadata column with the new IDs, default figure_id", default="figure_id", type=str)
+    parser.add_argument('--exclude', help="IDs to leave as they are", nargs='*', default=[], type=str)
+    parser.add_argument('--encoding', help="Encoding of the metadata file, default latin-1", default="latin-1", type=str)
+    parser.add_argument('--processes', help="Number of worker processes, default 1", default=1, type=int)
+    args = parser.parse_args()
+
+    #assert arguments and pair input and output files
+    inputs = args.input
+    if args.list:
+        with open(args.list) as filelist:
+            inputs = inputs + [line.strip() for line in filelist if line.strip()]
+    assert inputs, "Provide files to translate with --input and/or --list"
+    files = input_files(inputs)
+    if args.output:
+        assert len(files) == 1, "--output takes one input file, use --outdir for more"
+        pairs = [(files[0], args.output)]
+    else:
+        assert args.outdir, "Provide --output or --outdir"
+        os.makedirs(args.outdir, exist_ok = True)
+        pairs = [(infile, output_file(infile, args.outdir, args.suffix)) for infile in files]
+
+    translator = IdTranslator(read_id_map(args.metadata, args.source, args.target, set(args.exclude), args.encoding))
+    done = translator.translate_files(pairs, args.processes)
+    print("Translated {} files".format(done), file = sys.stderr)
@@ -0,0 +1,189 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Single-file container for window alignments, as alternative to a folder with one fasta file per window.
+A container consists of two files:
+PREFIX.aln      all windows one after the other, each as a taxa x length block of upper case ASCII bytes (lower case is converted),
+                optionally compressed per window with zlib
+PREFIX.aln.idx  tab-separated index: the taxa, the compression, and per window its name, offset, size in bytes and length
+Any window can be read at random as a taxa x length uint8 numpy array. Uncompressed windows are read-only views
+on the memory-mapped data file, so nothing is copied until the array is used.
+Functions can be imported in other scripts (see WindowContainer and WindowContainerWriter),
+or the script can convert between a folder of window fasta files and a container.
+
+USAGE
+python window_container.py pack --windows /fullpath/windows/ [--list filenames.txt] [--compress] --container PREFIX
+python window_container.py unpack --container PREFIX --windows /fullpath/windows/
+python window_container.py list --container PREFIX
+
+from window_container import WindowContainer
+windows = WindowContainer("PREFIX")
+array = windows.get("chr1:0-100000")
+
+Created 18OCT26
+"""
+
+# Import modules
+import argparse
+import mmap
+import os
+import zlib
+import numpy as np
+
+# Define functions
+class WindowContainerWriter(object):
+    # Writes windows to a new container. Use as context manager, or call close() to write the index.
+    def __init__(self, prefix, taxa, compress = False, level = 1):
+        self.prefix = prefix
+        self.taxa = list(taxa)
+        self.compress = compress
+        self.level = level
+        self.index = []
+        self.offset = 0
+        self.data = open(prefix + ".aln.tmp", "wb")
+
+    def add(self, window, sequences):
+        # Adds one window. sequences are str, bytes or a taxa x length uint8 array, in the order of the taxa.
+        # Stored in upper case, so soft-masked (lower case) bases compare equal to the same base in upper case.
+        if isinstance(sequences, np.ndarray):
+            block = np.ascontiguousarray(sequences, dtype = np.uint8)
+        else:
+            block = np.frombuffer(b"".join(seq.encode() if isinstance(seq, str) else bytes(seq) for seq in sequences), dtype = np.uint8)
+            block = block.reshape(len(sequences), -1) if len(sequences) else block
+        assert block.shape[0] == len(self.taxa), "Window {} has {} sequences for {} taxa".format(window, block.shape[0], len(self.taxa))
+        length = block.shape[1]
+        block = block.tobytes().upper()
+        if self.compress:
+            block = zlib.compress(block, self.level)
+        self.data.write(block)
+        self.index.append((window, self.offset, len(block), length))
+        self.offset += len(block)
+
+    def close(self):
+        # Writes the index and moves both files in place
+        self.data.close()
+        with open(self.prefix + ".aln.idx.tmp", "w") as index:
+            index.write("#taxa\t" + "\t".join(self.taxa) + "\n")
+            index.write("#compression\t" + ("zlib" if self.compress else "none") + "\n")
+            for window, offset, size, length in self.index:
+                index.write("{}\t{}\t{}\t{}\n".format(window, offset, size, length))
+        os.replace(self.prefix + ".aln.tmp", self.prefix + ".aln")
+        os.replace(self.prefix + ".aln.idx.tmp", self.prefix + ".aln.idx")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.close()
+        else:
+            self.data.close()
+
+class WindowContainer(object):
+    # Random access to the windows of a container.
+    def __init__(self, prefix):
+        self.prefix = prefix
+        self.windows = []
+        self.index = {}
+        with open(prefix + ".aln.idx") as index:
+            for line in index:
+                fields = line.rstrip("\n").split("\t")
+                if fields[0] == "#taxa":
+                    self.taxa = fields[1:]
+                elif fields[0] == "#compression":
+                    self.compressed = fields[1] == "zlib"
+                else:
+                    self.windows.append(fields[0])
+                    self.index[fields[0]] = (int(fields[1]), int(fields[2]), int(fields[3]))
+        self._file = open(prefix + ".aln", "rb")
+        self._data = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ) if os.path.getsize(prefix + ".aln") else b""
+
+    def __len__(self):
+        return len(self.windows)
+
+    def __contains__(self, window):
+        return window in self.index
+
+    def get(self, window):
+        # Returns a window as taxa x length uint8 array (read-only view on the data file if not compressed)
+        offset, size, length = self.index[window]
+        if self.compressed:
+            block = np.frombuffer(zlib.decompress(self._data[offset:offset + size]), dtype = np.uint8)
+        else:
+            block = np.frombuffer(self._data, dtype = np.uint8, count = size, offset = offset)
+        return block.reshape(len(self.taxa), length)
+
+    def records(self, window):
+        # Returns a window as list of (taxon, sequence string)
+        block = self.get(window)
+        return [(taxon, row.tobytes().decode()) for taxon, row in zip(self.taxa, block)]
+
+    def write_fasta(self, window, outfile):
+        # Writes a window as fasta file, in the format of createWindow_aln_JL.py
+        with open(outfile, "w") as out_file:
+            for taxon, seq in self.records(window):
+                out_file.write(">" + taxon + "\n" + seq + "\n")
+
+    def close(self):
+        if self._data:
+            self._data.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+def pack(window_dir, prefix, listfile = None, compress = False):
+    # Packs a folder of window fasta files (all with the same taxa) into a container. Returns the number of windows.
+    from fasta_windows import read_window
+    if listfile:
+        with open(listfile) as filelist:
+            filenames = [os.path.basename(line.strip()) for line in filelist if line.strip()]
+    else:
+        filenames = sorted(name for name in os.listdir(window_dir) if name.endswith((".fasta", ".fa")))
+    writer = None
+    for filename in filenames:
+        taxa, seqs = read_window(os.path.join(window_dir, filename), sort_ids = False)
+        if writer is None:
+            writer = WindowContainerWriter(prefix, taxa, compress)
+        assert taxa == writer.taxa, "Window {} does not contain the same taxa as the other windows".format(filename)
+        writer.add(".".join(filename.split(".")[:-1]), seqs)
+    assert writer is not None, "No window files found"
+    writer.close()
+    return len(filenames)
+
+def unpack(prefix, window_dir):
+    # Writes all windows of a container as fasta files, plus filenames.txt next to the folder. Returns the number of windows.
+    if not os.path.exists(window_dir):
+        os.makedirs(window_dir)
+    with WindowContainer(prefix) as container:
+        with open(os.path.join(os.path.dirname(os.path.normpath(window_dir)), "filenames.txt"), "w") as filenames:
+            for window in container.windows:
+                container.write_fasta(window, os.path.join(window_dir, window + ".fasta"))
+                filenames.write(window + ".fasta\n")
+        return len(container)
+
+if __name__ == "__main__":
+    #take command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices = ["pack", "unpack", "list"], help = "pack a window folder, unpack a container, or list the windows of a container")
+    parser.add_argument("--container", required = True, help = "Absolute path and prefix of the container (PREFIX.aln and PREFIX.aln.idx)")
+    parser.add_argument("--windows", help = "Absolute path to the folder with window fasta files")
+    parser.add_argument("--list", help = "Optional text file listing the window files to pack, one per line")
+    parser.add_argument("--compress", action = "store_true", help = "Compress each window with zlib")
+    args = parser.parse_args()
+
+    if args.command == "pack":
+        assert args.windows, "Provide the window folder with --windows"
+        print("Packed {} windows".format(pack(args.windows, args.container, args.list, args.compress)))
+    elif args.command == "unpack":
+        assert args.windows, "Provide the window folder with --windows"
+        print("Unpacked {} windows".format(unpack(args.container, args.windows)))
+    else:
+        with WindowContainer(args.container) as container:
+            print("Taxa: " + ", ".join(container.taxa))
+            for window in container.windows:
+                print(window + "\t" + str(container.index[window][2]))
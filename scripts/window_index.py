@@ -0,0 +1,177 @@
+#!/usr/bin/env python
+
+"""
+DESCRIPTION
+Script to count, once, the symbols of every taxon in every window alignment, and to select windows by cut-off from
+those counts, without reading or rewriting the windows again.
+Per window and taxon the index holds the number of A, C, G and T, of IUPAC ambiguity codes (MRWSYKVHDB), of missing
+data (N and -) and of other symbols, plus the sequence length. The index is a numpy .npz file.
+Cut-off as in check_Ncontent.py: a window is informative if every taxon has at least CUT-OFF percent of its
+sequence that is not N or - (ambiguity codes count as data). Uninformative windows are completely masked with N's.
+
+build   counts all windows of a folder (or of the windows in a list file) into the index
+query   lists the informative windows for a cut-off, writes the summary like check_Ncontent.py, and optionally writes
+        the masked copy of the windows folder (--write, as check_Ncontent.py: informative windows hardlinked, others as N-strings)
+
+USAGE
+python window_index.py build --windows /fullpath/100kb/windows --index /fullpath/100kb/window_index.npz [--list filenames.txt] [--processes 8]
+python window_index.py query --index /fullpath/100kb/window_index.npz --cutoff 40 --filenames filenames_informative.txt [--summary summary_40.txt] [--write /fullpath/100kb40/windows]
+
+from window_index import WindowIndex
+index = WindowIndex.load("window_index.npz")
+index.informative(70)                                       # boolean per window
+for name, ids, seqs in index.masked_windows(70): ...        # windows read lazily, uninformative ones as N-strings
+
+Author: Jonas Lescroart
+Created 18OCT26
+"""
+
+#import modules
+import argparse
+import os
+import sys
+import numpy as np
+from multiprocessing import Pool
+from fasta_windows import read_window
+from check_Ncontent import informative_counts, write_checked_window, summary_text
+
+#define functions
+CATEGORIES = ["acgt", "ambiguous", "missing", "other"]
+
+def category_table():
+    # Returns a 256-entry table with the category (index in CATEGORIES) of every byte; lowercase (soft-masked) symbols as uppercase, as in check_Ncontent.py
+    table = np.full(256, 3, dtype = np.uint8)
+    for category, symbols in enumerate([b"ACGT", b"MRWSYKVHDB", b"N-"]):
+        table[np.frombuffer(symbols, dtype = np.uint8)] = category
+        table[np.frombuffer(symbols.lower(), dtype = np.uint8)] = category
+    return table
+
+CATEGORY = category_table()
+
+def window_counts(filename):
+    # Returns the sequence ids and a taxa x categories array of counts of one window file
+    ids, seqs = read_window(filename)
+    counts = np.zeros((len(ids), len(CATEGORIES)), dtype = np.int64)
+    for i, seq in enumerate(seqs):
+        counts[i] = np.bincount(CATEGORY[np.frombuffer(seq, dtype = np.uint8)], minlength = len(CATEGORIES))
+    return ids, counts
+
+def _window_counts(filename):
+    # Pool worker
+    return window_counts(filename)
+
+class WindowIndex(object):
+    # Symbol counts (windows x taxa x CATEGORIES) of a set of window files
+    def __init__(self, directory, windows, taxa, counts):
+        self.directory = directory
+        self.windows = list(windows)
+        self.taxa = list(taxa)
+        self.counts = counts
+
+    @classmethod
+    def build(cls, directory, windows = None, processes = 1):
+        # Counts the window files in directory (all .fasta and .fa files, or the names in windows)
+        if windows is None:
+            windows = sorted(name for name in os.listdir(directory) if name.endswith((".fa", ".fasta")))
+        paths = [os.path.join(directory, window) for window in windows]
+        if processes > 1:
+            with Pool(processes) as pool:
+                results = list(pool.imap(_window_counts, paths, chunksize = 64))
+        else:
+            results = [window_counts(path) for path in paths]
+        taxa = results[0][0] if results else []
+        counts = np.zeros((len(windows), len(taxa), len(CATEGORIES)), dtype = np.int64)
+        for w, (ids, window) in enumerate(results):
+            assert ids == taxa, "Window {} has other taxa than {}".format(windows[w], windows[0])
+            counts[w] = window
+        return cls(os.path.abspath(directory), windows, taxa, counts)
+
+    def save(self, path):
+        # Writes the index to a .npz file (written under a temporary name first)
+        with open(path + ".tmp", "wb") as out:
+            np.savez(out, directory = np.array(self.directory), windows = np.array(self.windows), taxa = np.array(self.taxa), counts = self.counts)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path):
+        # Reads an index written by save
+        with np.load(path) as data:
+            return cls(str(data["directory"]), data["windows"].tolist(), data["taxa"].tolist(), data["counts"])
+
+    @property
+    def lengths(self):
+        # windows x taxa array of sequence lengths
+        return self.counts.sum(axis = 2)
+
+    def invalid(self):
+        # Returns the windows with symbols other than A, C, G, T, IUPAC ambiguity codes, N and -
+        return [window for window, other in zip(self.windows, self.counts[:, :, 3].sum(axis = 1)) if other]
+
+    def informative(self, cutoff = 50):
+        # Returns a boolean array, True for windows where every taxon has at least cutoff percent non-missing data
+        return informative_counts(self.lengths, self.counts[:, :, 2], cutoff).all(axis = 1)
+
+    def passing(self, cutoff = 50):
+        # Returns the names of the informative windows
+        return [window for window, good_window in zip(self.windows, self.informative(cutoff)) if good_window]
+
+    def masked_windows(self, cutoff = 50, directory = None):
+        # Yields (window, ids, sequences) for all windows, read when asked for; uninformative windows as N-strings of the same length
+        directory = directory or self.directory
+        for window, good_window, lengths in zip(self.windows, self.informative(cutoff), self.lengths):
+            if good_window:
+                ids, seqs = read_window(os.path.join(directory, window))
+            else:
+                ids, seqs = list(self.taxa), [b"N" * int(length) for length in lengths]
+            yield window, ids, seqs
+
+    def write_masked(self, new_dir, cutoff = 50, copy = False, directory = None):
+        # Writes the windows folder as check_Ncontent.py does: informative windows hardlinked (or copied), others as N-strings.
+        # Only uninformative windows are read.
+        directory = directory or self.directory
+        if not os.path.exists(new_dir):
+            os.makedirs(new_dir)
+        for window, good_window in zip(self.windows, self.informative(cutoff)):
+            write_checked_window(os.path.join(directory, window), os.path.join(new_dir, window), good_window, copy)
+
+if __name__ == "__main__":
+    #take command line arguments
+    parser = argparse.ArgumentParser()
+    parser.add_argument("mode", choices = ["build", "query"], help = "build the index, or query it for a cut-off")
+    parser.add_argument("--index", required = True, help = "Index file (.npz)")
+    parser.add_argument("--windows", help = "build: folder with the window fastas")
+    parser.add_argument("--list", help = "build: file with the names of the windows to index, one per line (default all .fasta and .fa files)")
+    parser.add_argument("-p", "--processes", type = int, default = 1, help = "build: number of processes, default 1")
+    parser.add_argument("--cutoff", type = int, default = 50, help = "query: cut-off as percentage from 0 to 100, default 50")
+    parser.add_argument("--filenames", help = "query: output file with the names of the informative windows")
+    parser.add_argument("--summary", help = "query: output summary file, as check_Ncontent.py")
+    parser.add_argument("--write", metavar = "DIR", help = "query: also write the masked windows folder to DIR")
+    parser.add_argument("--copy", action = "store_true", help = "query: with --write, copy informative windows instead of hardlinking them")
+    args = parser.parse_args()
+
+    if args.mode == "build":
+        assert args.windows and os.path.isdir(args.windows), "Provide the folder with the windows with --windows"
+        windows = None
+        if args.list:
+            with open(args.list) as names:
+                windows = [os.path.basename(line.strip()) for line in names if line.strip()]
+        index = WindowIndex.build(args.windows, windows, args.processes)
+        invalid = index.invalid()
+        assert not invalid, "Sequence contains symbols other than A,T,C,G, IUPAC ambiguity codes or N, - in " + ", ".join(invalid[:10])
+        index.save(args.index)
+        print("Indexed {} windows of {} taxa".format(len(index.windows), len(index.taxa)), file = sys.stderr)
+    else:
+        assert 0 <= args.cutoff <= 100, "Cut-off value must be an int between 0 and 100"
+        index = WindowIndex.load(args.index)
+        informative_filenames = index.passing(args.cutoff)
+        if args.filenames:
+            with open(args.filenames, "w") as filenames:
+                filenames.writelines(filename + "\n" for filename in informative_filenames)
+        else:
+            sys.stdout.writelines(filename + "\n" for filename in informative_filenames)
+        if args.summary:
+            with open(args.summary, "w") as summary:
+                summary.write(summary_text(index.directory, args.cutoff, len(index.windows), len(index.windows) - len(informative_filenames)))
+        if args.write:
+            index.write_masked(args.write, args.cutoff, args.copy)
+        print("Cut-off {}: {} of {} windows informative".format(args.cutoff, len(informative_filenames), len(index.windows)), file = sys.stderr)